@@ -4,6 +4,7 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.graph.builder import GraphBuilder
+from src.graph.persistence import DEFAULT_GRAPH_PATH
 
 import asyncio
 import argparse
@@ -12,24 +13,39 @@ def main():
     parser = argparse.ArgumentParser(description="Build Knowledge Graph")
     parser.add_argument("--provider", type=str, default=None, help="LLM Provider (ollama or openrouter)")
     parser.add_argument("--limit", type=int, default=None, help="Limit number of docs per type (None for all)")
-    parser.add_argument("--concurrency", type=int, default=2, help="Async concurrency")
+    parser.add_argument("--concurrency", type=int, default=2, help="Initial async concurrency (adapted at runtime)")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Upper bound for adaptive concurrency (default 4x --concurrency)")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens-per-minute budget for the LLM provider")
+    parser.add_argument("--batch-tokens", type=int, default=0, help="Pack chunks into one extraction request up to this many tokens (0 disables batching)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85, help="Reuse one extraction for chunks at least this similar (0 disables)")
+    parser.add_argument("--resume", action="store_true", help="Start after the last fully extracted document of the previous run")
+    parser.add_argument("--changed-only", action="store_true", help="Only read documents whose current content the graph was not built from")
     args = parser.parse_args()
 
     print(f"Starting Knowledge Graph Construction with provider: {args.provider or 'auto'}...")
     builder = GraphBuilder(provider=args.provider)
     
+    build_options = {
+        "limit": args.limit,
+        "concurrency": args.concurrency,
+        "max_concurrency": args.max_concurrency,
+        "tokens_per_minute": args.tpm,
+        "batch_token_budget": args.batch_tokens,
+        "changed_only": args.changed_only,
+        "dedup_threshold": args.dedup_threshold,
+        "resume": args.resume,
+    }
+    
     async def run_build():
         print(f"Processing Slides (Limit {args.limit})...")
-        await builder.build_graph_async(limit=args.limit, query={"type": "slide"}, concurrency=args.concurrency)
+        await builder.build_graph_async(query={"type": "slide"}, **build_options)
         
         print(f"Processing Web Pages (Limit {args.limit})...")
-        await builder.build_graph_async(limit=args.limit, query={"type": "web_page"}, concurrency=args.concurrency) 
+        await builder.build_graph_async(query={"type": "web_page"}, **build_options)
     
     asyncio.run(run_build())
     
-    output_path = "data/knowledge_graph.gml"
-    os.makedirs("data", exist_ok=True)
-    builder.save_graph(output_path)
+    builder.save_graph(DEFAULT_GRAPH_PATH)
     print("Graph construction complete.")
 
 if __name__ == "__main__":
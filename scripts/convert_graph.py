@@ -0,0 +1,29 @@
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.graph.persistence import DEFAULT_GRAPH_PATH, FORMATS, load_graph, save_graph
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a knowledge graph between storage formats")
+    parser.add_argument("source", nargs="?", default="data/knowledge_graph.gml", help="Input graph file")
+    parser.add_argument("target", nargs="?", default=DEFAULT_GRAPH_PATH, help=f"Output graph file ({', '.join(FORMATS)})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = load_graph(args.source)
+    print(f"Loaded {args.source}: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    save_graph(graph, args.target)
+    print(f"Wrote {args.target} ({os.path.getsize(args.target)} bytes) in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    load_graph(args.target)
+    print(f"Reload check: {args.target} loads in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
-import networkx as nx
 import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.graph.persistence import DEFAULT_GRAPH_PATH, load_graph, resolve_graph_path
+
 def check_concept_neighborhood(concept_id="artificial_intelligence"):
-    path = "data/knowledge_graph.gml"
-    if not os.path.exists(path):
+    path = DEFAULT_GRAPH_PATH
+    if not resolve_graph_path(path):
         print("Graph file not found.")
         return
 
-    G = nx.read_gml(path)
+    G = load_graph(path)
     
     if not G.has_node(concept_id):
         print(f"Concept '{concept_id}' not found in graph.")
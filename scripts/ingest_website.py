@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -7,13 +8,22 @@ from src.ingestion.scraper import WebScraper
 from src.ingestion.store import MongoStore
 
 def main():
+    parser = argparse.ArgumentParser(description="Crawl the course website into MongoDB")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages fetched in parallel")
+    parser.add_argument("--delay", type=float, default=0.25, help="Minimum seconds between requests to one host (robots.txt may raise it)")
+    parser.add_argument("--media-workers", type=int, default=2, help="Parallel PDF/YouTube downloads")
+    parser.add_argument("--full", action="store_true", help="Clear the collection and re-download everything instead of re-crawling conditionally")
+    args = parser.parse_args()
+
     url = "https://pantelis.github.io/courses/ai/"
     print(f"Starting ingestion for: {url}")
     
     store = MongoStore()
-    store.clear_collection()
+    if args.full:
+        store.clear_collection()
     
-    scraper = WebScraper(url)
+    scraper = WebScraper(url, concurrency=args.concurrency, delay=args.delay, media_workers=args.media_workers,
+                         incremental=not args.full)
     scraper.scrape()
     
     store = MongoStore()
@@ -1,13 +1,17 @@
-import networkx as nx
+import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.graph.persistence import DEFAULT_GRAPH_PATH, load_graph, resolve_graph_path
+
 def inspect_resources():
-    path = "data/knowledge_graph.gml"
-    if not os.path.exists(path):
+    path = DEFAULT_GRAPH_PATH
+    if not resolve_graph_path(path):
         print("Graph file not found.")
         return
 
-    G = nx.read_gml(path)
+    G = load_graph(path)
     
     print("--- All Resource Nodes ---")
     count = 0
@@ -1,11 +1,11 @@
 import sys
 import os
-import networkx as nx
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.graph.builder import GraphBuilder
 from src.rag.engine import QueryEngine
+from src.graph.persistence import load_graph
 
 def verify_pipeline():
     print("=== 1. Building Targeted Graph (Slides + 2 Web Pages) ===")
@@ -17,10 +17,10 @@ def verify_pipeline():
     print("Processing Web Pages (Limit 2)...")
     builder.build_graph(limit=2, query={"type": "web_page"})
     
-    builder.save_graph("data/test_graph.gml")
+    builder.save_graph("data/test_graph.kgb")
     
     print("\n=== 2. Verifying Graph Structure ===")
-    G = nx.read_gml("data/test_graph.gml")
+    G = load_graph("data/test_graph.kgb")
     print(f"Nodes: {G.number_of_nodes()}, Edges: {G.number_of_edges()}")
     
     resource_nodes = [n for n, d in G.nodes(data=True) if d.get('type') == 'resource']
@@ -34,7 +34,7 @@ def verify_pipeline():
         print("WARNING: No spans found!")
 
     print("\n=== 3. Verifying RAG Query ===")
-    engine = QueryEngine(graph_path="data/test_graph.gml")
+    engine = QueryEngine(graph_path="data/test_graph.kgb")
     
     query = "What are the body motions?" # test
     print(f"Query: {query}")
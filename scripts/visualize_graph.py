@@ -1,13 +1,18 @@
+import sys
+import os
 import networkx as nx
 import matplotlib.pyplot as plt
-import os
 
-def visualize_graph(path="data/knowledge_graph.gml"):
-    if not os.path.exists(path):
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.graph.persistence import DEFAULT_GRAPH_PATH, load_graph, resolve_graph_path
+
+def visualize_graph(path=DEFAULT_GRAPH_PATH):
+    if not resolve_graph_path(path):
         print(f"Graph file not found at {path}")
         return
 
-    G = nx.read_gml(path)
+    G = load_graph(path)
     print(f"Loaded graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
 
     plt.figure(figsize=(12, 8))
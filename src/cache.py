@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+from contextlib import aclosing, closing
+import json
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable
+
+
+class ResponseCache:
+    """
+    Disk-backed LLM response cache (SQLite) with least-recently-used
+    eviction once the stored responses exceed `max_bytes`.
+    """
+    def __init__(self, path="data/llm_cache.sqlite", max_bytes=512 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key, count_miss=True):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._total_bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in rows])
+            self._total_bytes -= sum(size for _, size in rows)
+            self.evictions += len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._total_bytes,
+        }
+
+
+# A wrapped model sets this in a message's (or any stream chunk's) response_metadata
+# when the response must not be cached, e.g. it came from a different model than
+# the one the cache key names.
+NO_CACHE = "no_cache"
+
+
+def is_cacheable(message):
+    return not (getattr(message, 'response_metadata', None) or {}).get(NO_CACHE)
+
+
+def _render_prompt(input):
+    if isinstance(input, PromptValue):
+        return [[m.type, m.content] for m in input.to_messages()]
+    if isinstance(input, str):
+        return [["human", input]]
+    if isinstance(input, list):
+        return [[getattr(m, 'type', 'human'), getattr(m, 'content', str(m))] for m in input]
+    return [["human", str(input)]]
+
+
+class CachedLLM(Runnable):
+    """
+    Wraps a chat model so byte-identical prompts are answered from the
+    ResponseCache. Set `enabled = False` (or LLM_CACHE=0) to bypass it.
+    """
+    def __init__(self, llm, cache, enabled=True):
+        self.llm = llm
+        self.cache = cache
+        self.enabled = enabled
+
+    def __getattr__(self, name):
+        # Delegate model attributes (model_name, temperature, ...) to the wrapped LLM.
+        if name == 'llm':
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def cache_key(self, input, **kwargs):
+        payload = json.dumps([
+            getattr(self.llm, 'model_name', None) or getattr(self.llm, 'model', None),
+            getattr(self.llm, 'temperature', None),
+            _render_prompt(input),
+            sorted((k, repr(v)) for k, v in kwargs.items()),
+        ])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _lookup(self, input, kwargs):
+        if not self.enabled:
+            return None, None
+        key = self.cache_key(input, **kwargs)
+        return key, self.cache.get(key)
+
+    def _store(self, key, content):
+        if key and isinstance(content, str):
+            self.cache.put(key, content)
+
+    def store(self, input, content, **kwargs):
+        """Caches `content` for `input`, e.g. after a caller stopped a stream early."""
+        if self.enabled:
+            self._store(self.cache_key(input, **kwargs), content)
+
+    def discard(self, input, **kwargs):
+        """Drops the cached response for `input`, e.g. one that failed to parse."""
+        if self.enabled:
+            self.cache.delete(self.cache_key(input, **kwargs))
+
+    async def alookup(self, input, **kwargs):
+        """
+        Cached response text for `input`, or None. A miss is not counted here:
+        the call that follows it counts it.
+        """
+        if not self.enabled:
+            return None
+        key = self.cache_key(input, **kwargs)
+        return await asyncio.to_thread(self.cache.get, key, False)
+
+    async def astore(self, input, content, **kwargs):
+        await asyncio.to_thread(self.store, input, content, **kwargs)
+
+    async def adiscard(self, input, **kwargs):
+        await asyncio.to_thread(self.discard, input, **kwargs)
+
+    def invoke(self, input, config=None, **kwargs):
+        key, cached = self._lookup(input, kwargs)
+        if cached is not None:
+            return AIMessage(content=cached)
+        result = self.llm.invoke(input, config, **kwargs)
+        if is_cacheable(result):
+            self._store(key, result.content)
+        return result
+
+    # The async paths do their SQLite I/O on a worker thread, off the event loop.
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key, cached = await asyncio.to_thread(self._lookup, input, kwargs)
+        if cached is not None:
+            return AIMessage(content=cached)
+        result = await self.llm.ainvoke(input, config, **kwargs)
+        if is_cacheable(result):
+            await asyncio.to_thread(self._store, key, result.content)
+        return result
+
+    def stream(self, input, config=None, **kwargs):
+        key, cached = self._lookup(input, kwargs)
+        if cached is not None:
+            yield AIMessageChunk(content=cached)
+            return
+        parts = []
+        cacheable = True
+        # Closing this wrapper early closes the inner stream too, not just at garbage collection.
+        with closing(self.llm.stream(input, config, **kwargs)) as stream:
+            for chunk in stream:
+                parts.append(chunk.content)
+                cacheable = cacheable and is_cacheable(chunk)
+                yield chunk
+        if cacheable:
+            self._store(key, "".join(parts))
+
+    async def astream(self, input, config=None, **kwargs):
+        key, cached = await asyncio.to_thread(self._lookup, input, kwargs)
+        if cached is not None:
+            yield AIMessageChunk(content=cached)
+            return
+        parts = []
+        cacheable = True
+        async with aclosing(self.llm.astream(input, config, **kwargs)) as stream:
+            async for chunk in stream:
+                parts.append(chunk.content)
+                cacheable = cacheable and is_cacheable(chunk)
+                yield chunk
+        if cacheable:
+            await asyncio.to_thread(self._store, key, "".join(parts))
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache shared by every LLM returned from get_llm."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite"),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+            )
+    return _response_cache
@@ -1,36 +1,79 @@
 import json
 import os
+import re
 import networkx as nx
 import asyncio
-from src.utils import get_llm
+from bson import json_util
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import count_tokens, get_llm
+from src.cache import CachedLLM, is_cacheable
+from src.llm_pool import LLMPool
 from src.ingestion.store import MongoStore
 from src.graph.chunker import Chunker
+from src.graph.persistence import load_graph, resolve_graph_path, save_graph
+from src.graph.journal import CheckpointJournal
+from src.graph.limiter import AdaptiveLimiter
+from src.graph.dedup import NearDuplicateIndex
+from src.graph.json_stream import JSONObjectScanner
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 
+# Rough per-request allowance for the instruction preamble and the JSON answer,
+# added to the chunk's own tokens when charging the tokens-per-minute budget.
+EXTRACTION_TOKEN_OVERHEAD = 1024
+
+# Only the fields chunking needs; skips the raw HTML and anything else large.
+CHUNK_PROJECTION = {"url": 1, "type": 1, "content": 1, "metadata": 1, "content_hash": 1}
+
+# Documents whose current version the graph was not built from (including never-built ones).
+UNBUILT_QUERY = {"$or": [
+    {"content_hash": {"$exists": False}},
+    {"$expr": {"$ne": ["$content_hash", "$built_hash"]}},
+]}
+
 class GraphBuilder:
     def __init__(self, provider=None, persistent_dir="data"):
         self.store = MongoStore()
         self.chunker = Chunker()
+        # Last document (in read order) up to which every document's chunks are
+        # recorded, and that point per query, saved with each checkpoint.
+        self.last_document_id = None
+        self.resume_points = {}
         self.persistent_dir = persistent_dir
-        self.graph_path = os.path.join(persistent_dir, "knowledge_graph.gml")
+        self.graph_path = os.path.join(persistent_dir, "knowledge_graph.kgb")
         self.state_path = os.path.join(persistent_dir, "processed_chunks.json")
+        self.journal = CheckpointJournal(os.path.join(persistent_dir, "checkpoint.journal"))
+        # Journal appends and snapshot writes each get one ordered worker thread,
+        # so neither blocks the event loop and a slow snapshot never delays appends.
+        self._journal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._checkpoint_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending_checkpoint = None
+        self._checkpoint_lock = asyncio.Lock()
         
-        if os.path.exists(self.graph_path):
-            print(f"Resuming: Loading existing graph from {self.graph_path}")
-            self.graph = nx.read_gml(self.graph_path)
+        existing_graph = resolve_graph_path(self.graph_path)
+        if existing_graph:
+            print(f"Resuming: Loading existing graph from {existing_graph}")
+            self.graph = load_graph(existing_graph)
         else:
             self.graph = nx.DiGraph()
             
         self.processed_ids = set()
+        # chunk id -> {"source", "nodes", "edges"} the chunk contributed, so a
+        # changed document can retract exactly what its old chunks added.
+        self.provenance = {}
+        self.document_chunks = {}
+        self.node_refs = Counter()
+        self.edge_refs = Counter()
         if os.path.exists(self.state_path):
             try:
-                with open(self.state_path, 'r') as f:
-                    self.processed_ids = set(json.load(f))
+                self.load_state()
                 print(f"Resuming: Loaded {len(self.processed_ids)} processed chunk IDs")
             except Exception as e:
                 print(f"Warning: Could not load state file: {e}")
 
+        self.replay_journal()
+
         self.llm = get_llm(provider=provider)
         
         # Define extraction prompt
@@ -39,8 +82,7 @@ class GraphBuilder:
         
         CRITICAL INSTRUCTIONS:
         1. This task is VITAL. Failure to produce valid JSON will break the entire system.
-        2. You MUST think step by step before generating the JSON. Briefly explain your reasoning in a "Thought:" section at the beginning.
-        3. The final output MUST contain a valid JSON block enclosed in curly braces.
+        2. Output ONLY a valid JSON object enclosed in curly braces, with no other text before or after it.
         
         JSON FORMATTING RULES (STRICT):
         - ESCAPE ALL DOUBLE QUOTES inside string values. Example: "He said \\"Hello\\"" NOT "He said "Hello"".
@@ -73,6 +115,44 @@ class GraphBuilder:
         
         self.chain = self.extraction_prompt | self.llm | StrOutputParser()
 
+        # Several chunks per request: the instructions are sent and processed once per batch.
+        self.batch_extraction_prompt = ChatPromptTemplate.from_template("""
+        You are an expert Knowledge Graph builder. Below are several numbered text chunks, each wrapped in <chunk id="N"> tags.
+        Extract Concepts, Relations, and Examples from EACH chunk separately.
+        
+        CRITICAL INSTRUCTIONS:
+        1. Output ONLY a valid JSON object enclosed in curly braces, with no other text.
+        2. Return exactly one entry per chunk, using the chunk's id. Use empty lists for chunks with no relevant concepts.
+        
+        JSON FORMATTING RULES (STRICT):
+        - ESCAPE ALL DOUBLE QUOTES inside string values. Example: "He said \\"Hello\\"" NOT "He said "Hello"".
+        - ESCAPE ALL BACKSLASHES in LaTeX. Example: "\\\\theta" NOT "\\theta".
+        - NO newlines or tabs inside string values unless escaped ("\\\\n").
+        
+        Schema:
+        {{
+            "chunks": [
+                {{
+                    "chunk": "1",
+                    "concepts": [
+                        {{"id": "unique_snake_case_id", "title": "Human Readable Title", "definition": "Concise definition"}}
+                    ],
+                    "relations": [
+                        {{"source": "concept_id_1", "target": "concept_id_2", "type": "relation_type (e.g., IS_A, PART_OF, DEPENDS_ON, RELATED_TO)", "description": "Brief explanation"}}
+                    ],
+                    "examples": [
+                        {{"content": "Description of the example", "related_concepts": ["concept_id_1"]}}
+                    ]
+                }}
+            ]
+        }}
+
+        Chunks to analyze:
+        {chunks}
+        """)
+        
+        self.batch_chain = self.batch_extraction_prompt | self.llm | StrOutputParser()
+
     def repair_json(self, json_str):
         """
         Attempts to repair common JSON errors:
@@ -198,6 +278,9 @@ class GraphBuilder:
                 print(f"Warning: No JSON object found in output. Raising error to trigger retry.")
                 raise ValueError("No JSON object found in output")
 
+        return self.load_json(output_str)
+
+    def load_json(self, output_str):
         def try_load(s):
             try:
                 return json.loads(s)
@@ -221,22 +304,183 @@ class GraphBuilder:
                     print(f"Failed to parse JSON even after repair and truncation fix: {e}")
                     raise ValueError(f"Failed to parse JSON: {e}")
 
-    def save_checkpoint(self):
+    def parse_batch_output(self, output_str, chunk_count):
+        """
+        Returns {position: extraction_result} for the chunks the model answered.
+        Chunks it skipped are simply absent so the caller can retry them alone.
+        """
+        start_idx = output_str.find('{') if output_str else -1
+        end_idx = output_str.rfind('}') if output_str else -1
+        if start_idx == -1 or end_idx <= start_idx:
+            raise ValueError("No JSON object found in batch output")
+
+        parsed = self.load_json(output_str[start_idx:end_idx + 1])
+        entries = parsed.get("chunks") if isinstance(parsed, dict) else parsed
+        if not isinstance(entries, list):
+            raise ValueError("Batch output has no 'chunks' list")
+
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                position = int(str(entry.get("chunk", "")).strip()) - 1
+            except ValueError:
+                continue
+            if 0 <= position < chunk_count:
+                results[position] = entry
+        return results
+
+    def replay_journal(self):
+        replayed = 0
+        for record in self.journal.replay():
+            self.apply_delta(record)
+            replayed += 1
+        if replayed:
+            print(f"Resuming: Replayed {replayed} journal records ({len(self.processed_ids)} chunks processed)")
+
+    def load_state(self):
+        with open(self.state_path, 'r') as f:
+            state = json.load(f)
+        if isinstance(state, list):
+            # Legacy "url::index" ids carry no provenance and never match
+            # content-addressed ids, so those chunks are extracted once more.
+            self.processed_ids = set(state)
+            return
+        for chunk_id, provenance in state.get("chunks", {}).items():
+            self._track_chunk(chunk_id, provenance)
+        self.resume_points = {query: json_util.loads(doc_id) for query, doc_id in state.get("resume", {}).items()}
+
+    def _track_chunk(self, chunk_id, provenance):
+        self.processed_ids.add(chunk_id)
+        self.provenance[chunk_id] = provenance
+        self.document_chunks.setdefault(provenance.get("source"), set()).add(chunk_id)
+        self.node_refs.update(provenance["nodes"])
+        self.edge_refs.update((u, v) for u, v in provenance["edges"])
+
+    def _provenance_from_delta(self, delta, source):
+        edges = list(dict.fromkeys((u, v) for u, v, _ in delta.get("edges", [])))
+        nodes = dict.fromkeys(node_id for node_id, _ in delta.get("nodes", []))
+        for u, v in edges:
+            nodes[u] = None
+            nodes[v] = None
+        return {"source": source, "nodes": list(nodes), "edges": [list(e) for e in edges]}
+
+    def retract_chunk(self, chunk_id):
+        """Removes edges and nodes no other processed chunk still contributes."""
+        self.processed_ids.discard(chunk_id)
+        provenance = self.provenance.pop(chunk_id, None)
+        if provenance is None:
+            return
+        self.document_chunks.get(provenance.get("source"), set()).discard(chunk_id)
+
+        for u, v in provenance["edges"]:
+            self.edge_refs[(u, v)] -= 1
+            if self.edge_refs[(u, v)] <= 0:
+                del self.edge_refs[(u, v)]
+                if self.graph.has_edge(u, v):
+                    self.graph.remove_edge(u, v)
+
+        for node in provenance["nodes"]:
+            self.node_refs[node] -= 1
+            if self.node_refs[node] <= 0:
+                del self.node_refs[node]
+                # Nodes still wired into untracked (legacy) content stay.
+                if self.graph.has_node(node) and self.graph.degree(node) == 0:
+                    self.graph.remove_node(node)
+
+    def retract_chunks(self, chunk_ids):
+        chunk_ids = list(chunk_ids)
+        for chunk_id in chunk_ids:
+            self.retract_chunk(chunk_id)
+        future = self._journal_executor.submit(self.journal.append, {"retract": chunk_ids})
+        future.add_done_callback(self._report_journal_error)
+
+    def apply_delta(self, delta):
+        for chunk_id in delta.get("retract", []):
+            self.retract_chunk(chunk_id)
+        for node_id, attrs in delta.get("nodes", []):
+            if not self.graph.has_node(node_id):
+                self.graph.add_node(node_id, **attrs)
+        for u, v, attrs in delta.get("edges", []):
+            self.graph.add_edge(u, v, **attrs)
+        chunk_id = delta.get("chunk")
+        if chunk_id and chunk_id not in self.provenance:
+            self._track_chunk(chunk_id, self._provenance_from_delta(delta, delta.get("source")))
+
+    def record_chunk(self, chunk_id, delta, source=None):
+        """Journals one processed chunk: O(delta) instead of rewriting the graph."""
+        self._track_chunk(chunk_id, self._provenance_from_delta(delta, source))
+        future = self._journal_executor.submit(self.journal.append, {"chunk": chunk_id, "source": source, **delta})
+        future.add_done_callback(self._report_journal_error)
+
+    def _report_journal_error(self, future):
+        if future.exception():
+            print(f"Error appending to checkpoint journal: {future.exception()}")
+
+    def _report_store_error(self, future):
+        if future.exception():
+            print(f"Error recording built document: {future.exception()}")
+
+    def _write_checkpoint(self, graph, provenance, resume_points, segment):
         os.makedirs(self.persistent_dir, exist_ok=True)
         
-        nx.write_gml(self.graph, self.graph_path)
+        save_graph(graph, self.graph_path)
         
-        with open(self.state_path, 'w') as f:
-            json.dump(list(self.processed_ids), f)
+        tmp_state_path = f"{self.state_path}.tmp"
+        with open(tmp_state_path, 'w') as f:
+            resume = {query: json_util.dumps(doc_id) for query, doc_id in resume_points.items()}
+            json.dump({"version": 2, "chunks": provenance, "resume": resume}, f)
+        os.replace(tmp_state_path, self.state_path)
         
-        print(f"Checkpoint saved: {len(self.graph.nodes)} nodes, {len(self.processed_ids)} chunks processed.")
+        # Only what this snapshot covers; a later rotation's segment stays.
+        self.journal.discard_rotated(segment)
+        print(f"Checkpoint saved: {len(graph.nodes)} nodes, {len(provenance)} chunks processed.")
+
+    def save_checkpoint(self):
+        """Compacts the journal into a full snapshot plus state file."""
+        segment = self._journal_executor.submit(self.journal.rotate).result()
+        self._write_checkpoint(self.graph, self.provenance, self.resume_points, segment)
+
+    async def save_checkpoint_async(self):
+        """
+        Compacts in the background. Only the journal rotation and an in-memory
+        copy of the graph happen on the event loop; serialization runs on the
+        checkpoint thread while extraction continues. Workers that reach the
+        compaction interval together compact one at a time.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._checkpoint_lock:
+            if self._pending_checkpoint and not self._pending_checkpoint.done():
+                print("Previous checkpoint still writing; waiting for it before starting another...")
+            await self.wait_for_checkpoint()
+
+            # Everything journaled before the rotation is already in self.graph,
+            # so a copy taken afterwards covers the rotated journal completely.
+            segment = await loop.run_in_executor(self._journal_executor, self.journal.rotate)
+            graph = self.graph.copy()
+            provenance = dict(self.provenance)
+            resume_points = dict(self.resume_points)
+
+            self._pending_checkpoint = loop.run_in_executor(
+                self._checkpoint_executor, self._write_checkpoint, graph, provenance, resume_points, segment
+            )
+
+    async def wait_for_checkpoint(self):
+        if self._pending_checkpoint:
+            try:
+                await self._pending_checkpoint
+            except Exception as e:
+                print(f"Error writing checkpoint: {e}")
+            self._pending_checkpoint = None
+
+    async def flush_checkpoints(self):
+        """Writes a final snapshot and waits for all pending checkpoint I/O."""
+        await self.save_checkpoint_async()
+        await self.wait_for_checkpoint()
 
     def build_graph(self, limit=None, query=None):
-        filter_query = query if query else {}
-        docs = self.store.collection.find(filter_query)
-        if limit:
-            docs = docs.limit(limit)
-            
+        docs = self.store.iter_documents(query, CHUNK_PROJECTION, limit=limit)
         for doc in docs:
             url = doc['url']
             print(f"Processing: {url}")
@@ -254,92 +498,410 @@ class GraphBuilder:
                 except Exception as e:
                     print(f"Error processing chunk {i} of {url}: {e}")
 
-    async def process_chunk_async(self, text, metadata, semaphore, max_retries=10):
-        async with semaphore:
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    result_str = await self.chain.ainvoke({"text": text})
-                    result = self.parse_output(result_str)
-                    return result, metadata
-                except Exception as e:
-                    import traceback
-                    traceback.print_exc() # Optional: reduce noise if retrying forever
-                    print(f"Error processing chunk (Attempt {attempt}): {e}")
-                    
-                    if max_retries and attempt >= max_retries:
-                        print(f"Max retries ({max_retries}) reached. Skipping chunk.")
-                        return None, None
-                    
-                    import asyncio
-                    # Exponential backoff, capped at 60 seconds
-                    sleep_time = min(2 * attempt, 60)
-                    print(f"Retrying in {sleep_time} seconds...")
-                    await asyncio.sleep(sleep_time)
-
-    async def build_graph_async(self, limit=None, query=None, concurrency=2):
-        filter_query = query if query else {}
-        docs = list(self.store.collection.find(filter_query))
-        if limit:
-            docs = docs[:limit]
+    async def cached_response(self, prompt_value):
+        """
+        The cached answer to `prompt_value`, if any. Callers check this before
+        taking a limiter slot, so cache hits neither skew the latency the
+        limiter adapts to nor spend the tokens-per-minute budget.
+        """
+        if isinstance(self.llm, CachedLLM):
+            return await self.llm.alookup(prompt_value)
+        return None
+
+    def first_json_object(self, text):
+        scanner = JSONObjectScanner()
+        scanner.feed(text)
+        if not scanner.text:
+            raise ValueError("No JSON object found in output")
+        return scanner.text
+
+    async def stream_extraction(self, prompt_value):
+        """
+        Streams the completion and returns the text of the first JSON object
+        in it, closing the stream as soon as that object is complete. Raises
+        StreamingJSONError (a ValueError) as soon as the output goes wrong.
+        """
+        scanner = JSONObjectScanner()
+        cacheable = True
+        stream = self.llm.astream(prompt_value)
+        try:
+            async for chunk in stream:
+                cacheable = cacheable and is_cacheable(chunk)
+                if scanner.feed(chunk.content):
+                    break
+        finally:
+            # Closing the stream drops the connection, which ends generation.
+            await stream.aclose()
+        if not scanner.text:
+            raise ValueError("No JSON object found in output")
+        if scanner.complete and cacheable and isinstance(self.llm, CachedLLM):
+            # The wrapper only caches streams that run to the end.
+            await self.llm.astore(prompt_value, scanner.text)
+        # An unfinished object (e.g. output cut at the token limit) is left to load_json's repairs.
+        return scanner.text
+
+    async def process_chunk_async(self, text, metadata, limiter, max_retries=10):
+        prompt_value = await self.extraction_prompt.ainvoke({"text": text})
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                cached = await self.cached_response(prompt_value)
+                if cached is not None:
+                    result_str = self.first_json_object(cached)
+                else:
+                    async with limiter.slot(count_tokens(text) + EXTRACTION_TOKEN_OVERHEAD):
+                        result_str = await self.stream_extraction(prompt_value)
+                result = self.load_json(result_str)
+                return result, metadata
+            except Exception as e:
+                print(f"Error processing chunk (Attempt {attempt}): {type(e).__name__}: {e}")
+                if isinstance(e, ValueError) and isinstance(self.llm, CachedLLM):
+                    # Don't let the retry be answered with the same bad output.
+                    await self.llm.adiscard(prompt_value)
+                
+                if max_retries and attempt >= max_retries:
+                    print(f"Max retries ({max_retries}) reached. Skipping chunk.")
+                    return None, None
+                
+                # Bad output is retried at once; anything else backs off first.
+                if not isinstance(e, ValueError):
+                    await self.backoff(attempt)
+
+    async def backoff(self, attempt):
+        """
+        Exponential backoff, capped at 60 seconds. The slot is released while
+        waiting, and the limiter has already cut overall pressure if this was a throttle.
+        """
+        sleep_time = min(2 ** attempt, 60)
+        print(f"Retrying in {sleep_time} seconds...")
+        await asyncio.sleep(sleep_time)
+
+    def make_batches(self, chunks, token_budget, max_batch_size=8):
+        """Packs (chunk, chunk_id) pairs into batches whose text fits the token budget."""
+        batches = []
+        current = []
+        current_tokens = 0
+        for chunk_data, chunk_id in chunks:
+            if 'tokens' not in chunk_data:
+                chunk_data['tokens'] = count_tokens(chunk_data['text'])
+            tokens = chunk_data['tokens']
+            if current and (current_tokens + tokens > token_budget or len(current) >= max_batch_size):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append((chunk_data, chunk_id))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def process_batch_async(self, batch, limiter, max_retries=2):
+        """
+        Extracts a whole batch in one request. Returns [(chunk_data, chunk_id, result)]
+        for the chunks it resolved and the list of chunks that still need
+        per-chunk extraction.
+        """
+        sections = "\n\n".join(
+            f'<chunk id="{i + 1}">\n{chunk_data["text"]}\n</chunk>'
+            for i, (chunk_data, _) in enumerate(batch)
+        )
+        prompt_value = await self.batch_extraction_prompt.ainvoke({"chunks": sections})
+        results = {}
+        for attempt in range(1, max_retries + 1):
+            try:
+                result_str = await self.cached_response(prompt_value)
+                if result_str is None:
+                    # The instructions go out once per request, not once per chunk.
+                    async with limiter.slot(count_tokens(sections) + EXTRACTION_TOKEN_OVERHEAD):
+                        result_str = await self.batch_chain.ainvoke({"chunks": sections})
+                results = self.parse_batch_output(result_str, len(batch))
+                break
+            except Exception as e:
+                print(f"Error processing batch of {len(batch)} chunks (Attempt {attempt}): {e}")
+                if isinstance(e, ValueError) and isinstance(self.llm, CachedLLM):
+                    # Don't let the retry, or a later rebuild, be answered with the same bad output.
+                    await self.llm.adiscard(prompt_value)
+                if not isinstance(e, ValueError):
+                    # Also before falling back, so a throttle doesn't turn into a burst of per-chunk calls.
+                    await self.backoff(attempt)
+
+        resolved = []
+        leftovers = []
+        for i, (chunk_data, chunk_id) in enumerate(batch):
+            if i in results:
+                resolved.append((chunk_data, chunk_id, results[i]))
+            else:
+                leftovers.append((chunk_data, chunk_id))
+        if leftovers:
+            print(f"Falling back to per-chunk extraction for {len(leftovers)} of {len(batch)} batched chunks.")
+        return resolved, leftovers
+
+    def _next_document_chunks(self, cursor):
+        """Blocking: pulls the next document off the cursor and chunks it."""
+        doc = next(cursor, None)
+        if doc is None:
+            return None, None
+        info = {"_id": doc['_id'], "url": doc['url'], "content_hash": doc.get('content_hash')}
+        return info, self.chunker.chunk_document(doc)
+
+    async def build_graph_async(self, limit=None, query=None, concurrency=2, compact_interval=500, batch_token_budget=None,
+                                queue_size=None, max_concurrency=None, tokens_per_minute=None, changed_only=False,
+                                after_id=None, dedup_threshold=0.85, resume=False):
+        """
+        Streams documents from Mongo through chunking into a bounded queue
+        consumed by extraction workers, so memory stays flat and the first LLM
+        call goes out as soon as the first document is chunked. `concurrency`
+        is only the starting point: the limiter adapts it between 1 and
+        `max_concurrency` (default 4x) from observed latency and throttling.
+        Both scale with the number of local hosts in the LLM pool.
+        With `changed_only`, only documents whose current content hash the
+        graph was not built from are read; a document counts as built once
+        all of its chunks are recorded. `after_id` resumes after a
+        document's _id; with `resume`, the run starts after the
+        `last_document_id` a previous run of the same query checkpointed.
+        A run that extracts every document it reads clears that point.
+
+        Chunks whose text is a near-duplicate (MinHash similarity of at
+        least `dedup_threshold`; falsy disables) of one already queued in
+        this run are not sent to the LLM: the first chunk's extraction is
+        applied to each duplicate's own resource and span.
+        """
+        filter_query = dict(query) if query else {}
+        if changed_only:
+            filter_query = {"$and": [filter_query, UNBUILT_QUERY]}
+        resume_key = json.dumps(filter_query, sort_keys=True, default=str)
+        if resume and after_id is None:
+            after_id = self.resume_points.get(resume_key)
+            if after_id is not None:
+                print(f"Resuming after document {after_id}")
+        self.last_document_id = after_id
+        cursor = self.store.iter_documents(filter_query, CHUNK_PROJECTION, after_id=after_id, limit=limit)
             
-        print(f"Starting async build for {len(docs)} documents with concurrency {concurrency}...")
+        hosts = max(1, len(getattr(self.llm, 'endpoints', None) or []))
+        concurrency = concurrency * hosts
+        max_concurrency = max_concurrency or concurrency * 4
+        print(f"Starting async build with concurrency {concurrency} (adaptive up to {max_concurrency})...")
         
-        semaphore = asyncio.Semaphore(concurrency)
-        tasks = []
+        limiter = AdaptiveLimiter(initial=concurrency, maximum=max_concurrency, tokens_per_minute=tokens_per_minute)
+        self.limiter = limiter
+        # A lock is bound to the loop it first waits on; each asyncio.run gets its own.
+        self._checkpoint_lock = asyncio.Lock()
+        work_queue = asyncio.Queue(maxsize=queue_size or max_concurrency * 2)
         
-        total_chunks = 0
-        chunks_to_process = []
-        
-        for doc in docs:
-            url = doc['url']
-            doc_chunks = self.chunker.chunk_document(doc)
-            
-            for i, chunk in enumerate(doc_chunks):
-                # Generate stable ID
-                chunk_id = f"{url}::{i}"
-                
-                if chunk_id in self.processed_ids:
-                    continue
-                    
-                chunks_to_process.append((chunk, chunk_id))
-            
-            total_chunks += len(doc_chunks)
+        stats = {"documents": 0, "chunks": 0, "queued": 0, "retracted": 0, "deduplicated": 0}
+        processed_count = 0
+
+        dedup = NearDuplicateIndex(threshold=dedup_threshold) if dedup_threshold else None
+        # Cluster representative id -> duplicates waiting for its extraction,
+        # and -> its extraction once known (None if it failed).
+        followers = {}
+        cluster_results = {}
+
+        # Documents not yet fully extracted, in read order: _id -> {"content_hash",
+        # "waiting" chunk ids, "failed", "read", "done"}, and each waiting chunk's document.
+        # A failed document stays at the front, holding the resume point before it.
+        open_documents = {}
+        chunk_documents = {}
+        # Set once the producer has read every document the query matches.
+        exhausted = False
+        resume_cleared = False
+
+        def chunk_done(chunk_id, ok=True):
+            doc_id = chunk_documents.pop(chunk_id, None)
+            if doc_id is None:
+                return
+            entry = open_documents[doc_id]
+            entry["waiting"].discard(chunk_id)
+            entry["failed"] = entry["failed"] or not ok
+            finish_document(doc_id)
+
+        def finish_document(doc_id):
+            entry = open_documents[doc_id]
+            if entry["waiting"] or not entry["read"]:
+                return
+            entry["done"] = True
+            if not entry["failed"] and entry["content_hash"]:
+                # Ordered after the document's journal appends, so it is never
+                # marked built ahead of the extractions it stands for.
+                future = self._journal_executor.submit(self.store.mark_built, doc_id, entry["content_hash"])
+                future.add_done_callback(self._report_store_error)
 
-        print(f"Queuing {len(chunks_to_process)} chunks (Skipped {total_chunks - len(chunks_to_process)} already processed)...")
+            while open_documents:
+                first_id, first = next(iter(open_documents.items()))
+                if not first["done"] or first["failed"]:
+                    break
+                del open_documents[first_id]
+                self.last_document_id = first_id
+                self.resume_points[resume_key] = first_id
         
-        processed_count = 0
-        save_interval = 10
+        async def handle_result(chunk_id, result, meta):
+            nonlocal processed_count
+            members = [(chunk_id, meta)]
+            if dedup:
+                cluster_results[chunk_id] = result
+                members += [(follower_id, follower['metadata']) for follower, follower_id in followers.pop(chunk_id, [])]
+
+            for member_id, member_meta in members:
+                delta = self.update_graph(result, member_meta)
+                self.record_chunk(member_id, delta, member_meta.get('source'))
+                chunk_done(member_id)
+                
+                processed_count += 1
+                if processed_count % compact_interval == 0:
+                    print(f"LLM limiter: {limiter.stats()}")
+                    await self.save_checkpoint_async()
         
         async def process_wrapper(chunk_data, chunk_id):
-            nonlocal processed_count
             text = chunk_data['text']
             metadata = chunk_data['metadata']
             
-            result, meta = await self.process_chunk_async(text, metadata, semaphore)
+            result, meta = await self.process_chunk_async(text, metadata, limiter)
             
             if result:
-                self.update_graph(result, meta)
-                self.processed_ids.add(chunk_id)
+                await handle_result(chunk_id, result, meta)
+                return
+            chunk_done(chunk_id, ok=False)
+            if dedup:
+                # No shared extraction to reuse; its duplicates go on their own.
+                cluster_results[chunk_id] = None
+                for follower, follower_id in followers.pop(chunk_id, []):
+                    stats["deduplicated"] -= 1
+                    await process_wrapper(follower, follower_id)
+
+        async def batch_wrapper(batch):
+            resolved, leftovers = await self.process_batch_async(batch, limiter)
+            for chunk_data, chunk_id, result in resolved:
+                await handle_result(chunk_id, result, chunk_data['metadata'])
+            for chunk_data, chunk_id in leftovers:
+                await process_wrapper(chunk_data, chunk_id)
+
+        async def producer():
+            nonlocal exhausted
+            queued_ids = set()
+            pending = []
+            try:
+                while True:
+                    doc, doc_chunks = await asyncio.to_thread(self._next_document_chunks, cursor)
+                    if doc is None:
+                        break
+                    url = doc['url']
+                    waiting = set()
+                    open_documents[doc['_id']] = {"content_hash": doc['content_hash'], "waiting": waiting,
+                                                  "failed": False, "read": False, "done": False}
+                    stats["documents"] += 1
+                    stats["chunks"] += len(doc_chunks)
+                    
+                    # Chunks this document no longer produces are stale extractions.
+                    current_ids = {chunk['id'] for chunk in doc_chunks}
+                    stale_ids = self.document_chunks.get(url, set()) - current_ids
+                    if stale_ids:
+                        self.retract_chunks(stale_ids)
+                        stats["retracted"] += len(stale_ids)
+                    
+                    for chunk in doc_chunks:
+                        chunk_id = chunk['id']
+                        if chunk_id in self.processed_ids or chunk_id in queued_ids:
+                            continue
+                        queued_ids.add(chunk_id)
+                        waiting.add(chunk_id)
+                        chunk_documents[chunk_id] = doc['_id']
+                        stats["queued"] += 1
+
+                        if dedup:
+                            representative = dedup.representative(chunk_id, chunk['text'])
+                            if representative != chunk_id and cluster_results.get(representative, True) is not None:
+                                stats["deduplicated"] += 1
+                                if representative in cluster_results:
+                                    await handle_result(chunk_id, cluster_results[representative], chunk['metadata'])
+                                else:
+                                    followers.setdefault(representative, []).append((chunk, chunk_id))
+                                continue
+
+                        if batch_token_budget:
+                            pending.append((chunk, chunk_id))
+                        else:
+                            await work_queue.put((chunk, chunk_id))
+                    
+                    open_documents[doc['_id']]["read"] = True
+                    finish_document(doc['_id'])
+
+                    if pending:
+                        # Hold back the last, possibly under-filled batch for the next document.
+                        batches = self.make_batches(pending, batch_token_budget)
+                        for batch in batches[:-1]:
+                            await work_queue.put(batch)
+                        pending = batches[-1]
                 
-                processed_count += 1
-                if processed_count % save_interval == 0:
-                    self.save_checkpoint()
+                if pending:
+                    await work_queue.put(pending)
+                exhausted = limit is None or stats["documents"] < limit
+            finally:
+                cursor.close()
+                for _ in range(max_concurrency):
+                    await work_queue.put(None)
 
-        tasks = [process_wrapper(c, cid) for c, cid in chunks_to_process]
-        
-        if tasks:
-            await asyncio.gather(*tasks)
-            self.save_checkpoint()
-        else:
-            print("No new chunks to process.")
+        async def worker():
+            while True:
+                item = await work_queue.get()
+                if item is None:
+                    return
+                try:
+                    if isinstance(item, list):
+                        await batch_wrapper(item)
+                    else:
+                        await process_wrapper(*item)
+                except Exception as e:
+                    # Keep draining the queue so the producer never blocks on a dead pool.
+                    print(f"Error handling extraction result: {e}")
+
+        try:
+            # One worker per possible slot; the limiter decides how many actually call the LLM.
+            await asyncio.gather(producer(), *(worker() for _ in range(max_concurrency)))
+            if exhausted and not open_documents:
+                # Every document is extracted: the next resumed run starts from the top.
+                resume_cleared = self.resume_points.pop(resume_key, None) is not None
+        finally:
+            if stats["retracted"]:
+                print(f"Retracted {stats['retracted']} stale chunks from changed documents.")
+            print(f"Streamed {stats['documents']} documents: queued {stats['queued']} of {stats['chunks']} chunks "
+                  f"(Skipped {stats['chunks'] - stats['queued']} already processed)")
+            if dedup and stats["queued"]:
+                print(f"Near-duplicate chunks: {stats['deduplicated']} of {stats['queued']} reused an earlier extraction "
+                      f"({stats['deduplicated'] / stats['queued']:.0%} of extraction calls saved)")
+                orphaned = sum(len(members) for members in followers.values())
+                if orphaned:
+                    print(f"{orphaned} duplicate chunks were left for the next run: their representative never finished.")
+            if stats["queued"] or stats["retracted"] or resume_cleared:
+                await self.flush_checkpoints()
+                print(f"LLM limiter: {limiter.stats()}")
+                if isinstance(self.llm, CachedLLM):
+                    print(f"LLM cache: {self.llm.cache.stats()}")
+                if isinstance(getattr(self.llm, 'llm', self.llm), LLMPool):
+                    print(f"LLM endpoints: {getattr(self.llm, 'llm', self.llm).stats()}")
+            else:
+                print("No new chunks to process.")
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._journal_executor, self.store.flush)
+            except Exception as e:
+                print(f"Error recording built documents: {e}")
 
     def update_graph(self, extraction_result, metadata):
         concepts = extraction_result.get("concepts", [])
         relations = extraction_result.get("relations", [])
         examples = extraction_result.get("examples", [])
         
+        delta = {"nodes": [], "edges": []}
+
+        def add_node(node_id, **attrs):
+            if not self.graph.has_node(node_id):
+                self.graph.add_node(node_id, **attrs)
+                delta["nodes"].append([node_id, attrs])
+
+        def add_edge(u, v, **attrs):
+            self.graph.add_edge(u, v, **attrs)
+            delta["edges"].append([u, v, attrs])
+        
         source_url = metadata.get('source')
         span = metadata.get('span')
         res_type = metadata.get('type')
@@ -350,20 +912,16 @@ class GraphBuilder:
             res_id = source_url
             span = "" 
             
-        if not self.graph.has_node(res_id):
-            self.graph.add_node(res_id, type="resource", url=source_url, span=span, resource_type=res_type or "web")
+        add_node(res_id, type="resource", url=source_url, span=span, resource_type=res_type or "web")
         
         for concept in concepts:
             c_id = concept.get("id")
             if c_id:
-                if not self.graph.has_node(c_id):
-                    concept_data = concept.copy()
-                    concept_data.pop("type", None)
-                    self.graph.add_node(c_id, **concept_data, type="concept")
-                else:
-                    pass
+                concept_data = concept.copy()
+                concept_data.pop("type", None)
+                add_node(c_id, **concept_data, type="concept")
                 
-                self.graph.add_edge(res_id, c_id, type="explains")
+                add_edge(res_id, c_id, type="explains")
 
         for rel in relations:
             src = rel.get("source")
@@ -371,12 +929,10 @@ class GraphBuilder:
             r_type = rel.get("type")
             
             if src and tgt and r_type:
-                if not self.graph.has_node(src):
-                    self.graph.add_node(src, type="concept_placeholder")
-                if not self.graph.has_node(tgt):
-                    self.graph.add_node(tgt, type="concept_placeholder")
+                add_node(src, type="concept_placeholder")
+                add_node(tgt, type="concept_placeholder")
                 
-                self.graph.add_edge(src, tgt, type=r_type)
+                add_edge(src, tgt, type=r_type)
 
         for ex in examples:
             content = ex.get("content")
@@ -384,16 +940,15 @@ class GraphBuilder:
             
             if content and target_concept:
                 ex_id = f"ex_{hash(content)}"
-                if not self.graph.has_node(ex_id):
-                    self.graph.add_node(ex_id, type="example", content=content)
-                
-                if not self.graph.has_node(target_concept):
-                    self.graph.add_node(target_concept, type="concept_placeholder")
+                add_node(ex_id, type="example", content=content)
+                add_node(target_concept, type="concept_placeholder")
                     
-                self.graph.add_edge(ex_id, target_concept, type="exemplifies")
+                add_edge(ex_id, target_concept, type="exemplifies")
+
+        return delta
 
-    def save_graph(self, path="knowledge_graph.gml"):
-        nx.write_gml(self.graph, path)
+    def save_graph(self, path="knowledge_graph.kgb"):
+        save_graph(self.graph, path)
         print(f"Graph saved to {path}")
         print(f"Nodes: {self.graph.number_of_nodes()}, Edges: {self.graph.number_of_edges()}")
 
@@ -401,4 +956,4 @@ if __name__ == "__main__":
     import asyncio
     builder = GraphBuilder()
     asyncio.run(builder.build_graph_async(limit=5, concurrency=5))
-    builder.save_graph("test_graph.gml")
+    builder.save_graph("test_graph.kgb")
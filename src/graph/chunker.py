@@ -1,22 +1,48 @@
+import hashlib
+import json
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+# Bump when chunking logic changes in a way the parameters below don't capture.
+CHUNKER_VERSION = 1
+
 class Chunker:
     def __init__(self, chunk_size=1000, chunk_overlap=200):
+        separators = ["\n\n", "\n", ". ", " ", ""]
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
+            separators=separators
         )
+        config = json.dumps([CHUNKER_VERSION, chunk_size, chunk_overlap, separators])
+        self.fingerprint = hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+    def chunk_id(self, text, metadata):
+        """
+        Content-addressed id: changes only when the chunk text, its location
+        in the source, or the chunker configuration changes.
+        """
+        normalized = " ".join(text.split())
+        key = "\x1f".join([
+            self.fingerprint,
+            metadata.get('source') or "",
+            str(metadata.get('span') or ""),
+            normalized,
+        ])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
     def chunk_document(self, doc):
         doc_type = doc.get('type', 'web_page')
         
         if doc_type == 'slide':
-            return self.chunk_slide(doc)
+            chunks = self.chunk_slide(doc)
         elif doc_type == 'video':
-            return self.chunk_video(doc)
+            chunks = self.chunk_video(doc)
         else:
-            return self.chunk_web(doc)
+            chunks = self.chunk_web(doc)
+
+        for chunk in chunks:
+            chunk['id'] = self.chunk_id(chunk['text'], chunk['metadata'])
+        return chunks
 
     def chunk_slide(self, doc):
         chunks = []
@@ -0,0 +1,78 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+
+_PRIME = (1 << 31) - 1
+
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text.lower())).strip()
+
+
+class NearDuplicateIndex:
+    """
+    Groups exact and near-duplicate chunk texts (navigation, footers,
+    notebook boilerplate repeated across pages).
+
+    Each text gets a MinHash signature over word `shingle_size`-grams; the
+    signature is split into `bands` for locality-sensitive hashing, so only
+    texts sharing a band are compared. A text joins the cluster of the
+    first earlier text whose estimated Jaccard similarity is at least
+    `threshold`; otherwise it starts a new cluster.
+    """
+    def __init__(self, threshold=0.85, num_perm=64, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._exact = {}
+        self._signatures = {}
+        self._buckets = [{} for _ in range(bands)]
+
+    def signature(self, normalized):
+        words = normalized.split()
+        k = self.shingle_size
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.array([zlib.crc32(s.encode('utf-8')) & _PRIME for s in shingles], dtype=np.uint64)
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def representative(self, key, text):
+        """
+        Returns the key of the cluster `text` belongs to: an earlier key for
+        a (near-)duplicate, or `key` itself, which then represents a new cluster.
+        """
+        normalized = _normalize(text)
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        if digest in self._exact:
+            return self._exact[digest]
+
+        signature = self.signature(normalized)
+        best, best_score = None, self.threshold - 1e-9
+        seen = set()
+        for band, band_key in self._band_keys(signature):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                score = float(np.mean(self._signatures[candidate] == signature))
+                if score > best_score:
+                    best, best_score = candidate, score
+        if best is not None:
+            self._exact[digest] = best
+            return best
+
+        self._exact[digest] = key
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+        return key
@@ -0,0 +1,92 @@
+import glob
+import json
+import os
+
+
+class CheckpointJournal:
+    """
+    Append-only log of graph deltas written between full snapshots.
+
+    Each line is one JSON record. Compaction rotates the live journal to a
+    numbered segment `<path>.compacting.<n>`, writes the snapshot, then
+    deletes the segments that snapshot covers, so a crash at any point leaves
+    either the old snapshot plus every segment or the new snapshot plus the
+    later ones. Records are idempotent, so replaying a journal the snapshot
+    already covers is safe.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rotated_path = f"{path}.compacting"
+        self._file = None
+
+    def _segments(self):
+        """(number, path) of each rotated segment, oldest first."""
+        segments = []
+        if os.path.exists(self.rotated_path):
+            # Written before segments were numbered.
+            segments.append((0, self.rotated_path))
+        for path in glob.glob(glob.escape(self.rotated_path) + ".*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return sorted(segments)
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if self._file.tell() > 0:
+                # Never glue a new record onto a torn one.
+                self._file.write("\n")
+        return self._file
+
+    def append(self, record):
+        f = self._open()
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def replay(self):
+        for path in [path for _, path in self._segments()] + [self.path]:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn write from a crash; the record was never committed.
+                        print(f"Warning: Ignoring incomplete journal record in {path}")
+
+    def rotate(self):
+        """
+        Moves the live journal to a new segment. Returns the number of the
+        newest segment, which a snapshot taken now covers along with every
+        older one (left behind by compactions that never finished), or None
+        if there is nothing to discard.
+        """
+        self.close()
+        segments = self._segments()
+        last = segments[-1][0] if segments else None
+        if not os.path.exists(self.path):
+            return last
+        last = (last or 0) + 1
+        os.replace(self.path, f"{self.rotated_path}.{last}")
+        return last
+
+    def discard_rotated(self, upto):
+        """Deletes the segments numbered up to `upto`, as returned by rotate()."""
+        if upto is None:
+            return
+        for number, path in self._segments():
+            if number <= upto:
+                os.remove(path)
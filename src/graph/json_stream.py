@@ -0,0 +1,84 @@
+import re
+
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class StreamingJSONError(ValueError):
+    """The streamed output can no longer become a valid JSON object."""
+
+
+class JSONObjectScanner:
+    """
+    Follows a model's output as it streams in and finds the first top-level
+    JSON object, tracking nesting depth and string/escape state across
+    chunk boundaries. Text before the object (e.g. a ```json fence) is
+    skipped; `complete` turns True as soon as the object closes, so the
+    caller can stop generation instead of paying for trailing tokens.
+
+    Raises StreamingJSONError as soon as the structure is unrecoverable: a
+    bracket closing the wrong container, or no object starting within
+    `max_preamble` characters.
+    """
+    def __init__(self, max_preamble=2000):
+        self.max_preamble = max_preamble
+        self.complete = False
+        self._parts = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._preamble = 0
+
+    @property
+    def text(self):
+        """The object's text so far (all of it once `complete`)."""
+        return "".join(self._parts)
+
+    def feed(self, chunk):
+        """Consumes the next piece of output; returns `complete`."""
+        if self.complete or not chunk:
+            return self.complete
+
+        start = 0
+        if not self._stack:
+            start = chunk.find('{')
+            if start == -1:
+                self._preamble += len(chunk)
+                if self._preamble > self.max_preamble:
+                    raise StreamingJSONError(f"No JSON object within the first {self.max_preamble} characters")
+                return False
+
+        skip_to = start
+        if self._escape:
+            # The previous chunk ended on a backslash inside a string.
+            self._escape = False
+            skip_to += 1
+
+        for match in _STRUCTURAL.finditer(chunk, start):
+            pos = match.start()
+            if pos < skip_to:
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == '\\':
+                    if pos + 1 == len(chunk):
+                        self._escape = True
+                    skip_to = pos + 2
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(_CLOSERS[char])
+            elif char in '}]':
+                if not self._stack or self._stack[-1] != char:
+                    expected = self._stack[-1] if self._stack else "nothing"
+                    raise StreamingJSONError(f"Unexpected '{char}' (expected {expected}) in streamed JSON")
+                self._stack.pop()
+                if not self._stack:
+                    self._parts.append(chunk[start:pos + 1])
+                    self.complete = True
+                    return True
+
+        self._parts.append(chunk[start:])
+        return False
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import deque
+from src.ratelimit import TokenBucket, is_throttle_error
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for LLM calls. The limit grows by one after a
+    full window of healthy calls and halves on timeouts, 429s or 5xx
+    responses. Once the recent median latency exceeds `latency_tolerance`
+    times the best median seen so far, the limit steps back down by one.
+    The best median never counts as lower than `latency_floor` seconds, so
+    a run of unusually fast calls cannot make every normal call look slow.
+    """
+    def __init__(self, initial=2, minimum=1, maximum=16, tokens_per_minute=None, latency_tolerance=2.0,
+                 latency_floor=0.5):
+        self.minimum = minimum
+        self.maximum = max(maximum, initial)
+        self.limit = max(minimum, initial)
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.throttle_events = 0
+        self.latencies = deque(maxlen=200)
+        self._best_median = None
+        self._healthy_streak = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    def slot(self, tokens=0):
+        return _LimiterSlot(self, tokens)
+
+    async def _acquire(self, tokens):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        if self.bucket and tokens:
+            try:
+                await self.bucket.take(tokens)
+            except BaseException:
+                # Cancelled while waiting for tokens: give the slot back.
+                async with self._cond:
+                    self.in_flight -= 1
+                    self._cond.notify_all()
+                raise
+
+    async def _release(self, latency, exc):
+        async with self._cond:
+            self.in_flight -= 1
+            if isinstance(exc, asyncio.CancelledError):
+                pass
+            elif exc is None:
+                self.completed += 1
+                self.latencies.append(latency)
+                self._on_success()
+            elif is_throttle_error(exc):
+                self.throttle_events += 1
+                self._decrease(f"{type(exc).__name__}")
+            else:
+                # Parse failures and the like say nothing about backend load.
+                self.errors += 1
+            self._cond.notify_all()
+
+    def _recent_median(self):
+        recent = sorted(list(self.latencies)[-20:])
+        return recent[len(recent) // 2] if recent else None
+
+    def _on_success(self):
+        median = self._recent_median()
+        if median is not None and len(self.latencies) >= 5:
+            if self._best_median is None or median < self._best_median:
+                self._best_median = max(median, self.latency_floor)
+            if median > self._best_median * self.latency_tolerance:
+                self._healthy_streak = 0
+                self._decrease(f"latency {median:.1f}s vs best {self._best_median:.1f}s", halve=False)
+                return
+
+        self._healthy_streak += 1
+        if self._healthy_streak >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._healthy_streak = 0
+
+    def _decrease(self, reason, halve=True):
+        now = time.monotonic()
+        # One burst of failures from the same window should only halve once.
+        window = self._recent_median() or 1.0
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self.limit = max(self.minimum, self.limit // 2 if halve else self.limit - 1)
+        self._healthy_streak = 0
+        if self.limit != old_limit:
+            print(f"Concurrency limit {old_limit} -> {self.limit} ({reason})")
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def stats(self):
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "errors": self.errors,
+            "throttle_events": self.throttle_events,
+            "latency_p50": round(p50, 2) if p50 is not None else None,
+            "latency_p95": round(p95, 2) if p95 is not None else None,
+        }
+
+
+class _LimiterSlot:
+    def __init__(self, limiter, tokens):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.started = None
+
+    async def __aenter__(self):
+        await self.limiter._acquire(self.tokens)
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter._release(time.monotonic() - self.started, exc)
+        return False
@@ -0,0 +1,153 @@
+import os
+import pickle
+import struct
+from array import array
+import networkx as nx
+
+DEFAULT_GRAPH_PATH = "data/knowledge_graph.kgb"
+
+SNAPSHOT_MAGIC = b"KGSNAP"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct(">6sH")
+
+
+def _columns(records, pool):
+    """
+    Pivots per-item attribute dicts into sparse columns:
+    {key: (array of item indices, list of values)}.
+    """
+    columns = {}
+    for idx, attrs in enumerate(records):
+        for key, value in attrs.items():
+            indices, values = columns.setdefault(key, (array('I'), []))
+            indices.append(idx)
+            if isinstance(value, str):
+                # Repeated values ("concept", "explains", ...) share one object,
+                # which pickle then writes only once.
+                value = pool.setdefault(value, value)
+            values.append(value)
+    return {key: (indices.tobytes(), values) for key, (indices, values) in columns.items()}
+
+
+def _rows(columns, count):
+    records = [{} for _ in range(count)]
+    for key, (raw_indices, values) in columns.items():
+        indices = array('I')
+        indices.frombytes(raw_indices)
+        for idx, value in zip(indices, values):
+            records[idx][key] = value
+    return records
+
+
+def write_snapshot(graph, path):
+    nodes = list(graph.nodes())
+    node_ids = {node: i for i, node in enumerate(nodes)}
+    pool = {}
+
+    sources = array('I')
+    targets = array('I')
+    edge_attrs = []
+    for u, v, data in graph.edges(data=True):
+        sources.append(node_ids[u])
+        targets.append(node_ids[v])
+        edge_attrs.append(data)
+
+    payload = {
+        "directed": graph.is_directed(),
+        "graph": dict(graph.graph),
+        "nodes": nodes,
+        "node_columns": _columns((graph.nodes[n] for n in nodes), pool),
+        "sources": sources.tobytes(),
+        "targets": targets.tobytes(),
+        "edge_columns": _columns(edge_attrs, pool),
+    }
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as f:
+        magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported graph snapshot version {version} in {path}")
+        payload = pickle.load(f)
+
+    graph = nx.DiGraph() if payload["directed"] else nx.Graph()
+    graph.graph.update(payload["graph"])
+
+    nodes = payload["nodes"]
+    graph.add_nodes_from(zip(nodes, _rows(payload["node_columns"], len(nodes))))
+
+    sources = array('I')
+    sources.frombytes(payload["sources"])
+    targets = array('I')
+    targets.frombytes(payload["targets"])
+    edge_attrs = _rows(payload["edge_columns"], len(sources))
+    graph.add_edges_from(
+        (nodes[u], nodes[v], attrs) for u, v, attrs in zip(sources, targets, edge_attrs)
+    )
+    return graph
+
+
+def write_gml(graph, path):
+    nx.write_gml(graph, path)
+
+
+def read_gml(path):
+    return nx.read_gml(path)
+
+
+FORMATS = {
+    ".kgb": (read_snapshot, write_snapshot),
+    ".gml": (read_gml, write_gml),
+}
+
+
+def register_format(extension, reader, writer):
+    FORMATS[extension.lower()] = (reader, writer)
+
+
+def _format_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unknown graph format '{ext}' for {path}. Known: {', '.join(FORMATS)}")
+    return FORMATS[ext]
+
+
+def resolve_graph_path(path=DEFAULT_GRAPH_PATH):
+    """
+    Returns `path` if it exists, otherwise the first sibling with the same
+    stem in another known format (e.g. an older knowledge_graph.gml).
+    """
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for ext in FORMATS:
+        candidate = stem + ext
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def load_graph(path=DEFAULT_GRAPH_PATH):
+    resolved = resolve_graph_path(path)
+    if resolved is None:
+        raise FileNotFoundError(f"Graph file not found at {path}")
+    reader, _ = _format_for(resolved)
+    return reader(resolved)
+
+
+def save_graph(graph, path=DEFAULT_GRAPH_PATH):
+    """Writes the graph in the format implied by the extension, atomically."""
+    _, writer = _format_for(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    writer(graph, tmp_path)
+    os.replace(tmp_path, path)
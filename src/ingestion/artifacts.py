@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class ArtifactCache:
+    """
+    On-disk cache of downloaded artifacts (PDFs, transcripts).
+
+    Raw bytes are stored once per content hash under `blobs/`; `sources`
+    maps a URL or video id to the hash it last served along with its HTTP
+    validators; `parsed` holds the parser output per (hash, parser
+    version), so upgrading a parser re-parses cached bytes without
+    refetching them. Least recently used blobs (and their parsed output)
+    are evicted once the cache exceeds `max_bytes`.
+    """
+    def __init__(self, root="data/artifacts", max_bytes=2 * 1024 * 1024 * 1024):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "key TEXT PRIMARY KEY, hash TEXT NOT NULL, etag TEXT, last_modified TEXT, fetched REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parsed ("
+            "hash TEXT NOT NULL, parser TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "PRIMARY KEY (hash, parser))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM blobs) + (SELECT COALESCE(SUM(size), 0) FROM parsed)"
+        ).fetchone()[0]
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def new_temp_file(self, suffix=""):
+        """(fd, path) in the cache directory, so put_file can rename instead of copy."""
+        return tempfile.mkstemp(suffix=suffix, dir=self.tmp_dir)
+
+    def get_source(self, key):
+        """{"hash", "etag", "last_modified"} last stored for `key`, if its blob is still cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT s.hash, s.etag, s.last_modified FROM sources s JOIN blobs b ON b.hash = s.hash WHERE s.key = ?",
+                (key,)
+            ).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return {"hash": row[0], "etag": row[1], "last_modified": row[2]}
+
+    def put_file(self, key, path, digest, etag=None, last_modified=None):
+        """Moves the file at `path` into the cache under `digest`; returns the cached path."""
+        target = self.blob_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        size = os.path.getsize(path)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.replace(path, target)
+        self._record(key, digest, size, etag, last_modified)
+        return target
+
+    def put_bytes(self, key, data, etag=None, last_modified=None):
+        digest = hashlib.sha256(data).hexdigest()
+        fd, path = self.new_temp_file()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        self.put_file(key, path, digest, etag, last_modified)
+        return digest
+
+    def read_bytes(self, digest):
+        self.touch(digest)
+        with open(self.blob_path(digest), 'rb') as f:
+            return f.read()
+
+    def _record(self, key, digest, size, etag, last_modified):
+        now = time.time()
+        with self._lock:
+            existing = self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if existing:
+                self._conn.execute("UPDATE blobs SET accessed = ? WHERE hash = ?", (now, digest))
+            else:
+                self._conn.execute("INSERT INTO blobs (hash, size, accessed) VALUES (?, ?, ?)", (digest, size, now))
+                self._total_bytes += size
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (key, hash, etag, last_modified, fetched) VALUES (?, ?, ?, ?, ?)",
+                (key, digest, etag, last_modified, now)
+            )
+            self._evict(keep=digest)
+            self._conn.commit()
+
+    def touch(self, digest):
+        with self._lock:
+            self._conn.execute("UPDATE blobs SET accessed = ? WHERE hash = ?", (time.time(), digest))
+            self._conn.commit()
+
+    def get_parsed(self, digest, parser):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM parsed WHERE hash = ? AND parser = ?", (digest, parser)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE blobs SET accessed = ? WHERE hash = ?", (time.time(), digest))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put_parsed(self, digest, parser, value):
+        payload = json.dumps(value)
+        size = len(payload.encode('utf-8'))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM parsed WHERE hash = ? AND parser = ?", (digest, parser)
+            ).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed (hash, parser, value, size) VALUES (?, ?, ?, ?)",
+                (digest, parser, payload, size)
+            )
+            self._total_bytes += size
+            self._evict(keep=digest)
+            self._conn.commit()
+
+    def _evict(self, keep=None):
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT hash, size FROM blobs WHERE hash != ? ORDER BY accessed LIMIT 20", (keep or "",)
+            ).fetchall()
+            if not rows:
+                break
+            for digest, size in rows:
+                parsed_size = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM parsed WHERE hash = ?", (digest,)
+                ).fetchone()[0]
+                self._conn.execute("DELETE FROM parsed WHERE hash = ?", (digest,))
+                self._conn.execute("DELETE FROM sources WHERE hash = ?", (digest,))
+                self._conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+                try:
+                    os.remove(self.blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self._total_bytes -= size + parsed_size
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._total_bytes,
+        }
+
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_artifact_cache():
+    """Process-wide cache shared by the slide and transcript loaders."""
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            _artifact_cache = ArtifactCache(
+                root=os.getenv("ARTIFACT_CACHE_DIR", "data/artifacts"),
+                max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)),
+            )
+    return _artifact_cache
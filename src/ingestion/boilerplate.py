@@ -0,0 +1,49 @@
+from collections import Counter, defaultdict
+from itertools import groupby
+
+# Site chrome that never carries lecture content.
+CHROME_TAGS = ["script", "style", "noscript", "nav", "footer", "aside"]
+
+
+class BoilerplateDetector:
+    """
+    Learns a host's template from the pages crawled on it: a text line that
+    appears on at least `min_ratio` of the host's pages (and on at least
+    `min_pages` of them) is frequent. Only runs of at least `min_block`
+    consecutive frequent lines are menu, sidebar or footer text; a frequent
+    line on its own (an "Example" heading, a `$$` delimiter) is content.
+    Hosts with fewer than `min_pages` pages are left untouched.
+    """
+    def __init__(self, min_ratio=0.3, min_pages=5, min_block=3):
+        self.min_ratio = min_ratio
+        self.min_pages = min_pages
+        self.min_block = min_block
+        self.line_counts = defaultdict(Counter)
+        self.page_counts = Counter()
+        self._boilerplate = {}
+
+    def add(self, host, text):
+        self.line_counts[host].update(set(text.splitlines()))
+        self.page_counts[host] += 1
+        self._boilerplate.pop(host, None)
+
+    def boilerplate(self, host):
+        if host not in self._boilerplate:
+            pages = self.page_counts[host]
+            lines = set()
+            if pages >= self.min_pages:
+                cutoff = max(self.min_pages, self.min_ratio * pages)
+                lines = {line for line, count in self.line_counts[host].items() if count >= cutoff}
+            self._boilerplate[host] = lines
+        return self._boilerplate[host]
+
+    def strip(self, host, text):
+        boilerplate = self.boilerplate(host)
+        if not boilerplate:
+            return text
+        kept = []
+        for frequent, run in groupby(text.splitlines(), key=lambda line: line in boilerplate):
+            run = list(run)
+            if not frequent or len(run) < self.min_block:
+                kept.extend(run)
+        return "\n".join(kept)
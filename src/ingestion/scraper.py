@@ -1,25 +1,56 @@
+import asyncio
 import requests
 from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin, urlparse
 from urllib.robotparser import RobotFileParser
+import threading
 import time
 from src.ingestion.store import MongoStore
+from src.ratelimit import TokenBucket
 
+from src.ingestion.artifacts import get_artifact_cache
+from src.ingestion.boilerplate import CHROME_TAGS, BoilerplateDetector
 from src.ingestion.youtube_loader import YouTubeLoader
 from src.ingestion.slide_loader import SlideLoader
 
 class WebScraper:
-    def __init__(self, start_url, allowed_domains=None, base_path=None):
+    def __init__(self, start_url, allowed_domains=None, base_path=None, concurrency=8, delay=0.25, media_workers=2,
+                 incremental=True):
         self.start_url = start_url
         self.allowed_domains = allowed_domains or [urlparse(start_url).netloc]
         self.base_path = base_path or urlparse(start_url).path
         self.visited = set()
         self.store = MongoStore()
+        self.concurrency = concurrency
+        self.delay = delay
+        self.host_buckets = {}
+        self.incremental = incremental
+        # ETag / Last-Modified / content hash per URL from the previous crawl.
+        self.validators = self.store.get_validators() if incremental else {}
+        self.stats = {"changed": 0, "unchanged": 0, "not_modified": 0}
+        # HTML is saved as pages arrive; their text is saved after the crawl,
+        # once each host's template is known.
+        self.pages = {}
+        self.boilerplate = BoilerplateDetector()
+        # Pages the detector has already learned from, so a retried save doesn't count them twice.
+        self._learned = set()
+        self._stats_lock = threading.Lock()
+
+        # One keep-alive session shared by all fetch threads.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.media_workers = media_workers
         self.rp = RobotFileParser()
         self.setup_robots_txt(start_url)
         
-        self.yt_loader = YouTubeLoader()
-        self.slide_loader = SlideLoader()
+        self.artifacts = get_artifact_cache()
+        self.yt_loader = YouTubeLoader(cache=self.artifacts)
+        self.slide_loader = SlideLoader(session=self.session, cache=self.artifacts)
 
     def setup_robots_txt(self, url):
         parsed = urlparse(url)
@@ -40,82 +71,245 @@ class WebScraper:
             return False
         return True
 
+    def conditional_headers(self, url):
+        previous = self.validators.get(url) or {}
+        headers = {}
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+        return headers
+
+    def record_save(self, changed):
+        with self._stats_lock:
+            self.stats["changed" if changed else "unchanged"] += 1
+
+    def record_not_modified(self, url, etag=None, last_modified=None):
+        with self._stats_lock:
+            self.stats["not_modified"] += 1
+        self.store.mark_unchanged(url, etag=etag, last_modified=last_modified)
+
     def process_pdf(self, url):
         print(f"Processing PDF: {url}")
-        data = self.slide_loader.load_pdf(url)
-        if data:
-            self.store.save_document(url, data['text'], "", doc_type="slide", metadata={"pages": data['pages']})
+        data = self.slide_loader.load_pdf(url, headers=self.conditional_headers(url))
+        if data and data.get('not_modified'):
+            self.record_not_modified(url)
+        elif data:
+            changed = self.store.save_document(
+                url, data['text'], "", doc_type="slide", metadata={"pages": data['pages']},
+                etag=data.get('etag'), last_modified=data.get('last_modified'),
+                known_hash=self.validators.get(url, {}).get("content_hash")
+            )
+            self.record_save(changed)
 
     def process_youtube(self, url):
+        if url in self.validators:
+            # Transcripts have no validators and practically never change.
+            self.record_not_modified(url)
+            return
         print(f"Processing YouTube: {url}")
         data = self.yt_loader.get_transcript(url)
         if data:
-            self.store.save_document(url, data['text'], "", doc_type="video", metadata={"video_id": data['video_id'], "transcript": data['transcript']})
+            changed = self.store.save_document(url, data['text'], "", doc_type="video", metadata={"video_id": data['video_id'], "transcript": data['transcript']})
+            self.record_save(changed)
 
-    def scrape(self):
-        queue = [self.start_url]
+    def politeness_delay(self, host):
+        """Seconds between requests to `host`: robots.txt if it says more than `delay`."""
+        delay = self.delay
+        if host == urlparse(self.start_url).netloc:
+            crawl_delay = self.rp.crawl_delay("*")
+            if crawl_delay:
+                delay = max(delay, float(crawl_delay))
+            rate = self.rp.request_rate("*")
+            if rate and rate.requests:
+                delay = max(delay, rate.seconds / rate.requests)
+        return delay
+
+    def host_bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self.host_buckets:
+            delay = self.politeness_delay(host)
+            # One request per `delay` seconds, no bursts.
+            self.host_buckets[host] = TokenBucket(60.0 / delay, capacity=1) if delay > 0 else None
+        return self.host_buckets[host]
+
+    def is_youtube(self, url):
+        return "youtube.com" in url or "youtu.be" in url
+
+    def fetch_page(self, url):
+        """
+        Fetches and parses one page (runs on a fetch worker thread).
+        Returns (links, youtube_urls) found on it.
+        """
+        response = self.session.get(url, timeout=10, headers=self.conditional_headers(url))
+        if response.status_code == 304:
+            # Unchanged since the last crawl: work from the stored copy.
+            html = self.store.get_html(url)
+            if not html:
+                with self._stats_lock:
+                    self.stats["not_modified"] += 1
+                return [], []
+            soup = BeautifulSoup(html, 'html.parser')
+        elif response.status_code != 200:
+            print(f"Failed to fetch {url}: Status {response.status_code}")
+            return [], []
+        else:
+            html = response.text
+            soup = BeautifulSoup(response.content, 'html.parser')
+
+        previous = self.validators.get(url) or {}
+        etag = response.headers.get("ETag") or previous.get("etag")
+        last_modified = response.headers.get("Last-Modified") or previous.get("last_modified")
+        if response.status_code == 200:
+            self.store.save_html(url, html, etag=etag, last_modified=last_modified)
+        # Links first: navigation is about to be stripped from the text.
+        links = self.extract_links(url, soup)
+        self.pages[url] = {"text": self.page_text(url, soup), "etag": etag, "last_modified": last_modified,
+                           "not_modified": response.status_code == 304}
+        return links
+
+    def page_text(self, url, soup):
+        for img in soup.find_all('img'):
+            alt = img.get('alt', '')
+            src = img.get('src', '')
+            if alt:
+                img.replace_with(f"\n[Image: {alt} (URL: {urljoin(url, src)})]\n")
         
-        while queue:
-            url = queue.pop(0)
-            if url in self.visited:
-                continue
-            
-            self.visited.add(url)
-            
-            if url.lower().endswith('.pdf'):
-                self.process_pdf(url)
-                continue
-
-            if not self.can_fetch(url):
-                print(f"Skipping (robots.txt disallowed): {url}")
-                continue
-
-            print(f"Crawling: {url}")
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code != 200:
-                    print(f"Failed to fetch {url}: Status {response.status_code}")
-                    continue
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                for img in soup.find_all('img'):
-                    alt = img.get('alt', '')
-                    src = img.get('src', '')
-                    if alt:
-                        img.replace_with(f"\n[Image: {alt} (URL: {urljoin(url, src)})]\n")
-                
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                text_content = soup.get_text(separator='\n', strip=True)
-                
-                self.store.save_document(url, text_content, response.text)
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
-                    full_url = urljoin(url, href)
-                    full_url = full_url.split('#')[0]
-                    
-                    if "youtube.com" in full_url or "youtu.be" in full_url:
-                        if full_url not in self.visited:
-                            self.process_youtube(full_url)
-                            self.visited.add(full_url)
+        for tag in soup(CHROME_TAGS):
+            tag.decompose()
+        return soup.get_text(separator='\n', strip=True)
+
+    def save_pages(self):
+        """Drops lines repeated across a host's pages (its template), then saves the text of every page."""
+        # Fetch threads still running after an interruption may add pages meanwhile;
+        # each page leaves self.pages only once it is saved, so a failed save is retried.
+        pages = dict(self.pages)
+        for url, page in pages.items():
+            if url not in self._learned:
+                self._learned.add(url)
+                self.boilerplate.add(urlparse(url).netloc, page["text"])
+
+        before = after = 0
+        for url, page in pages.items():
+            content = self.boilerplate.strip(urlparse(url).netloc, page["text"])
+            before += len(page["text"])
+            after += len(content)
+            changed = self.store.save_document(
+                url, content, None,
+                etag=page["etag"], last_modified=page["last_modified"],
+                known_hash=self.validators.get(url, {}).get("content_hash")
+            )
+            if page["not_modified"] and not changed:
+                # Counted once, as a 304, not again as an unchanged save.
+                with self._stats_lock:
+                    self.stats["not_modified"] += 1
+            else:
+                self.record_save(changed)
+            del self.pages[url]
+        if before:
+            print(f"Boilerplate: kept {after} of {before} characters ({after / before:.0%}) across {len(pages)} pages")
+
+    def extract_links(self, url, soup):
+        links = []
+        videos = []
+        for link in soup.find_all('a', href=True):
+            full_url = urljoin(url, link['href']).split('#')[0]
+            if self.is_youtube(full_url):
+                videos.append(full_url)
+            elif self.is_valid_url(full_url):
+                links.append(full_url)
+        
+        for iframe in soup.find_all('iframe', src=True):
+            full_src = urljoin(url, iframe['src'])
+            if self.is_youtube(full_src):
+                videos.append(full_src)
+        return links, videos
+
+    async def crawl_page(self, url):
+        bucket = self.host_bucket(url)
+        if bucket:
+            await bucket.take(1)
+        print(f"Crawling: {url}")
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.fetch_executor, self.fetch_page, url)
+        except Exception as e:
+            print(f"Error processing {url}: {e}")
+            return [], []
+
+    async def process_media(self, url, handler):
+        if url.lower().endswith('.pdf'):
+            bucket = self.host_bucket(url)
+            if bucket:
+                await bucket.take(1)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.media_executor, handler, url)
+        except Exception as e:
+            print(f"Error processing {url}: {e}")
+
+    async def scrape_async(self):
+        """
+        Breadth-first crawl with up to `concurrency` pages in flight, each
+        host paced by its own token bucket. PDFs and YouTube transcripts go
+        to a separate, smaller pool so they never hold up page fetches.
+        """
+        frontier = deque([self.start_url])
+        pages = set()
+        media = set()
+        start = time.perf_counter()
+        self.fetch_executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetch")
+        self.media_executor = ThreadPoolExecutor(max_workers=self.media_workers, thread_name_prefix="media")
+
+        def schedule_media(url, handler):
+            if url not in self.visited:
+                self.visited.add(url)
+                media.add(asyncio.create_task(self.process_media(url, handler)))
+
+        try:
+            while frontier or pages:
+                while frontier and len(pages) < self.concurrency:
+                    url = frontier.popleft()
+                    if url in self.visited:
+                        continue
+                    if url.lower().endswith('.pdf'):
+                        schedule_media(url, self.process_pdf)
+                        continue
+                    self.visited.add(url)
+                    if not self.can_fetch(url):
+                        print(f"Skipping (robots.txt disallowed): {url}")
                         continue
+                    pages.add(asyncio.create_task(self.crawl_page(url)))
 
-                    if full_url not in self.visited and self.is_valid_url(full_url):
-                        queue.append(full_url)
-                
-                for iframe in soup.find_all('iframe', src=True):
-                    src = iframe['src']
-                    full_src = urljoin(url, src)
-                    if "youtube.com" in full_src or "youtu.be" in full_src:
-                        if full_src not in self.visited:
-                            self.process_youtube(full_src)
-                            self.visited.add(full_src)
-
-                time.sleep(0.5)
-
-            except Exception as e:
-                print(f"Error processing {url}: {e}")
+                if not pages:
+                    break
+                done, pages = await asyncio.wait(pages, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    links, videos = task.result()
+                    for video in videos:
+                        schedule_media(video, self.process_youtube)
+                    frontier.extend(link for link in links if link not in self.visited)
+
+            await asyncio.to_thread(self.save_pages)
+            if media:
+                print(f"Pages done; waiting for {len(media)} PDF/YouTube jobs...")
+                await asyncio.gather(*media)
+        finally:
+            self.fetch_executor.shutdown(wait=False)
+            self.media_executor.shutdown(wait=False)
+            try:
+                # After an error or Ctrl-C: keep the text of every page crawled so far.
+                self.save_pages()
+            finally:
+                self.slide_loader.close()
+                self.store.flush()
+        print(f"Crawled {len(self.visited)} URLs in {time.perf_counter() - start:.1f}s: "
+              f"{self.stats['changed']} changed, {self.stats['unchanged']} unchanged, "
+              f"{self.stats['not_modified']} answered 304 or already stored")
+        print(f"Artifact cache: {self.artifacts.stats()}")
+
+    def scrape(self):
+        asyncio.run(self.scrape_async())
 
 if __name__ == "__main__":
     scraper = WebScraper("https://pantelis.github.io/courses/ai/")
@@ -1,32 +1,238 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import pypdf
 import requests
-import io
 from pypdf import PdfReader
 
+# Bump when page extraction changes so cached decks are re-parsed.
+PARSER_VERSION = f"pypdf-{pypdf.__version__}/1"
+
+# Times a page is resubmitted after its pool was reset under it.
+MAX_PAGE_RESUBMITS = 3
+
+# Per worker process: the reader for the PDF it last worked on, so a deck's
+# cross-reference table is parsed once per worker rather than once per page.
+_worker_reader = (None, None)
+
+
+def _extract_page(path, index):
+    global _worker_reader
+    if _worker_reader[0] != path:
+        _worker_reader = (path, PdfReader(path))
+    return _worker_reader[1].pages[index].extract_text()
+
+
 class SlideLoader:
-    def __init__(self):
-        pass
+    """
+    Downloads PDFs to a temporary file and extracts their pages in a
+    process pool (one worker per CPU by default). A page that runs longer
+    than `page_timeout` seconds is returned empty and its worker replaced,
+    so one pathological deck cannot stall ingestion.
 
-    def load_pdf(self, url):
-        try:
-            response = requests.get(url, timeout=10)
+    With an ArtifactCache, downloads are revalidated against the cached
+    copy and parsed pages are reused for identical bytes.
+    """
+    def __init__(self, workers=None, page_timeout=30, session=None, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.page_timeout = page_timeout
+        self.session = session or requests.Session()
+        self.cache = cache
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: the crawler is multi-threaded, which fork does not mix well with.
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _reset_pool(self, pool):
+        """Kills the workers of `pool` (one may be stuck on a page) and starts fresh next time."""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def _is_current(self, pool):
+        with self._pool_lock:
+            return self._pool is pool
+
+    def _submit(self, path, index):
+        """Returns (pool, future), retrying if another thread reset the pool in between."""
+        while True:
+            pool = self._get_pool()
+            try:
+                return pool, pool.submit(_extract_page, path, index)
+            except RuntimeError:
+                # Shut down or broken since _get_pool handed it out.
+                self._reset_pool(pool)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def download(self, url, headers=None):
+        """
+        Streams the PDF to a temporary file, hashing it on the way.
+        Returns (path, sha256, response), or (None, None, response) if not 200.
+        """
+        with self.session.get(url, timeout=10, headers=headers, stream=True) as response:
             if response.status_code != 200:
+                return None, None, response
+            fd, path = self.cache.new_temp_file(".pdf") if self.cache else tempfile.mkstemp(suffix=".pdf")
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for block in response.iter_content(chunk_size=64 * 1024):
+                        digest.update(block)
+                        f.write(block)
+            except BaseException:
+                os.remove(path)
+                raise
+            return path, digest.hexdigest(), response
+
+    def _wait(self, future):
+        """
+        Result of a page future. The timeout counts from when the page starts
+        running, not while it waits behind other decks' pages in the queue.
+        """
+        started = None
+        while True:
+            remaining = min(1.0, self.page_timeout) if started is None else self.page_timeout - (time.monotonic() - started)
+            try:
+                return future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                if not future.running():
+                    continue
+                if started is None:
+                    started = time.monotonic()
+                elif time.monotonic() - started >= self.page_timeout:
+                    raise
+
+    def iter_pages(self, path):
+        """
+        Yields {"page", "text"} in page order as workers finish them, with
+        "failed": True on a page that timed out or could not be extracted. The pool
+        is shared by every thread loading decks, so pages lost to a reset
+        caused by another deck's timeout are resubmitted, not left blank.
+        """
+        page_count = len(PdfReader(path).pages)
+        jobs = [self._submit(path, i) for i in range(page_count)]
+        resubmits = [0] * page_count
+
+        def resubmit_lost(start):
+            # Whatever was queued or running on a reset pool died with it.
+            for j in range(start, page_count):
+                pool, future = jobs[j]
+                finished = future.done() and not future.cancelled() and future.exception() is None
+                if not finished and not self._is_current(pool) and resubmits[j] < MAX_PAGE_RESUBMITS:
+                    resubmits[j] += 1
+                    jobs[j] = self._submit(path, j)
+
+        try:
+            for i in range(page_count):
+                text = None
+                failed = False
+                while text is None:
+                    pool, future = jobs[i]
+                    try:
+                        text = self._wait(future) or ""
+                    except FutureTimeoutError:
+                        if not self._is_current(pool) and resubmits[i] < MAX_PAGE_RESUBMITS:
+                            # Another deck reset the pool while this page waited on it.
+                            resubmit_lost(i)
+                            continue
+                        print(f"Page {i+1} of {path} timed out after {self.page_timeout}s; skipping it")
+                        self._reset_pool(pool)
+                        resubmit_lost(i + 1)
+                        text, failed = "", True
+                    except (CancelledError, BrokenProcessPool) as e:
+                        # Our pool was reset or broken, not a problem with this page.
+                        if self._is_current(pool):
+                            self._reset_pool(pool)
+                        if resubmits[i] >= MAX_PAGE_RESUBMITS:
+                            print(f"Could not extract page {i+1} of {path}: {type(e).__name__}")
+                            text, failed = "", True
+                            continue
+                        resubmit_lost(i)
+                    except Exception as e:
+                        print(f"Could not extract page {i+1} of {path}: {e}")
+                        text, failed = "", True
+                page = {"page": i+1, "text": text}
+                if failed:
+                    page["failed"] = True
+                yield page
+        finally:
+            for _, future in jobs:
+                future.cancel()
+
+    def load_pdf(self, url, headers=None):
+        """
+        Returns {"pages", "text", "etag", "last_modified"}, {"not_modified": True}
+        when conditional `headers` match (304), or None on failure.
+        """
+        path = None
+        try:
+            cached = self.cache.get_source(url) if self.cache else None
+            request_headers = headers
+            if not headers and cached:
+                # The caller has no copy, but the artifact cache does.
+                request_headers = {}
+                if cached["etag"]:
+                    request_headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    request_headers["If-Modified-Since"] = cached["last_modified"]
+
+            path, digest, response = self.download(url, request_headers)
+            if response.status_code == 304 and headers:
+                return {"not_modified": True}
+            if response.status_code == 304 and cached:
+                print(f"PDF unchanged, using cached copy: {url}")
+                digest = cached["hash"]
+                etag, last_modified = cached["etag"], cached["last_modified"]
+                blob = self.cache.blob_path(digest)
+            elif path is None:
                 print(f"Failed to fetch PDF {url}: {response.status_code}")
                 return None
+            else:
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                blob = path
+                if self.cache:
+                    blob = self.cache.put_file(url, path, digest, etag, last_modified)
+                    path = None
+
+            pages = self.cache.get_parsed(digest, PARSER_VERSION) if self.cache else None
+            if pages is None:
+                pages = list(self.iter_pages(blob))
+                failed = [p["page"] for p in pages if p.pop("failed", False)]
+                if failed:
+                    # A timeout or crash is not the deck's final text; parse it again next time.
+                    print(f"Not caching {url}: {len(failed)} of {len(pages)} pages failed to extract")
+                elif self.cache:
+                    self.cache.put_parsed(digest, PARSER_VERSION, pages)
+            text_content = "".join(f"\n--- Page {p['page']} ---\n{p['text']}" for p in pages)
 
-            f = io.BytesIO(response.content)
-            reader = PdfReader(f)
-            
-            text_content = ""
-            pages = []
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                text_content += f"\n--- Page {i+1} ---\n{text}"
-                pages.append({"page": i+1, "text": text})
-            
             return {
                 "pages": pages,
-                "text": text_content
+                "text": text_content,
+                "etag": etag,
+                "last_modified": last_modified
             }
         except Exception as e:
             print(f"Error processing PDF {url}: {e}")
             return None
+        finally:
+            if path:
+                os.remove(path)
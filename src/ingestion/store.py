@@ -1,36 +1,209 @@
+import atexit
+import hashlib
 import os
-from pymongo import MongoClient
+import threading
+import zlib
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
 
 class MongoStore:
-    def __init__(self, db_name="ai_tutor", collection_name="raw_data"):
+    """
+    Writes are buffered and sent with one bulk_write once `flush_size`
+    operations are pending, or by a background timer `flush_interval`
+    seconds after the first buffered write; call flush() (or close()) when
+    done writing. Writes stay buffered if a flush fails.
+    """
+    def __init__(self, db_name="ai_tutor", collection_name="raw_data", flush_size=100, flush_interval=2.0):
         mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
         self.collection = self.db[collection_name]
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._flush_timer = None
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+        self.ensure_indexes()
 
-    def save_document(self, url, content, html, doc_type="web_page", metadata=None):
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([("url", ASCENDING)])
+            # Serves iter_documents(query={"type": ...}) in _id order.
+            self.collection.create_index([("type", ASCENDING), ("_id", ASCENDING)])
+        except Exception as e:
+            print(f"Warning: Could not create indexes: {e}")
+
+    def _write(self, operation):
+        with self._write_lock:
+            self._pending.append(operation)
+            due = len(self._pending) >= self.flush_size
+            if not due:
+                self._schedule_flush()
+        if due:
+            self.flush()
+
+    def _schedule_flush(self):
+        # Caller holds _write_lock.
+        if self._flush_timer is None and self.flush_interval:
+            self._flush_timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Warning: Could not flush buffered writes: {e}")
+            with self._write_lock:
+                self._flush_timer = None
+                self._schedule_flush()
+
+    def flush(self):
+        """Sends the buffered writes; returns how many landed. On error they stay buffered."""
+        written = 0
+        with self._write_lock:
+            if self._flush_timer:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            while self._pending:
+                operations = self._pending
+                try:
+                    # Ordered, so repeated writes to one URL land in call order.
+                    self.collection.bulk_write(operations, ordered=True)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors") or []
+                    if not errors:
+                        # Only the write concern failed; the writes themselves were applied.
+                        print(f"Warning: {e}")
+                        written += len(operations)
+                        self._pending = []
+                        break
+                    # Everything before the failed write landed, nothing after it ran.
+                    index = errors[0]["index"]
+                    print(f"Warning: Dropping a write that failed: {errors[0].get('errmsg')}")
+                    written += index
+                    self._pending = operations[index + 1:]
+                    continue
+                written += len(operations)
+                self._pending = []
+        return written
+
+    def close(self):
+        self.flush()
+        self.client.close()
+
+    def save_document(self, url, content, html, doc_type="web_page", metadata=None, etag=None, last_modified=None, known_hash=None):
         """
         Saves a document to MongoDB. Upserts based on URL.
+        If the content hash equals `known_hash` (from a previous crawl) only
+        the validators are refreshed and the document is marked unchanged.
+        Returns True if the stored content changed.
         """
         if metadata is None:
             metadata = {}
-            
+
+        content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        if known_hash == content_hash:
+            self.mark_unchanged(url, etag=etag, last_modified=last_modified)
+            return False
+
+        now = datetime.utcnow()
         document = {
             "url": url,
             "content": content, # Text content
-            "html": html,       # Raw HTML
             "type": doc_type,
             "metadata": metadata,
-            "ingested_at": datetime.utcnow()
+            "content_hash": content_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "changed": True,
+            "checked_at": now,
+            "ingested_at": now
         }
         
-        self.collection.update_one(
+        update = {"$set": document}
+        if html is not None:
+            # None keeps the HTML stored by save_html.
+            document["html_z"] = zlib.compress(html.encode('utf-8'), 6) if html else None # Raw HTML, see get_html
+            update["$unset"] = {"html": ""}
+        self._write(UpdateOne({"url": url}, update, upsert=True))
+        print(f"Saved/Updated: {url}")
+        return True
+
+    def save_html(self, url, html, etag=None, last_modified=None):
+        """
+        Stores a freshly crawled page's HTML and validators ahead of its text,
+        which save_document (with html=None) fills in once boilerplate is
+        known. A re-crawl after an interruption in between gets a 304 and
+        derives the text from this stored copy.
+        """
+        now = datetime.utcnow()
+        self._write(UpdateOne(
             {"url": url},
-            {"$set": document},
+            {
+                "$set": {"html_z": zlib.compress(html.encode('utf-8'), 6), "etag": etag,
+                         "last_modified": last_modified, "checked_at": now},
+                "$unset": {"html": ""},
+                "$setOnInsert": {"content": "", "type": "web_page", "metadata": {}, "ingested_at": now},
+            },
             upsert=True
-        )
-        print(f"Saved/Updated: {url}")
+        ))
+
+    def mark_unchanged(self, url, etag=None, last_modified=None):
+        """Records that a re-crawl found `url` unchanged; keeps its ingested_at."""
+        update = {"changed": False, "checked_at": datetime.utcnow()}
+        if etag:
+            update["etag"] = etag
+        if last_modified:
+            update["last_modified"] = last_modified
+        self._write(UpdateOne({"url": url}, {"$set": update}))
+        print(f"Unchanged: {url}")
+
+    def mark_built(self, doc_id, content_hash):
+        """Records that the knowledge graph now reflects this version of the document."""
+        self._write(UpdateOne({"_id": doc_id}, {"$set": {"built_hash": content_hash}}))
+
+    def get_validators(self):
+        """{url: {"etag", "last_modified", "content_hash"}} for conditional re-crawls."""
+        projection = {"_id": 0, "url": 1, "etag": 1, "last_modified": 1, "content_hash": 1}
+        return {doc["url"]: doc for doc in self.collection.find({}, projection)}
+
+    def get_html(self, url):
+        """Raw HTML, decompressed on demand (documents saved before compression keep `html`)."""
+        doc = self.collection.find_one({"url": url}, {"html_z": 1, "html": 1})
+        if not doc:
+            return None
+        if doc.get("html_z"):
+            return zlib.decompress(doc["html_z"]).decode('utf-8')
+        return doc.get("html")
+
+    def iter_documents(self, query=None, projection=None, batch_size=100, after_id=None, limit=None):
+        """
+        Yields documents matching `query` in _id order, fetching `batch_size`
+        at a time with only the `projection` fields (plus _id). Each batch is
+        its own query starting after the last _id seen, so a long consumer
+        never holds a server cursor open; pass a document's _id as
+        `after_id` to resume after it. `limit` caps the number of documents:
+        None means no limit, 0 means none at all (never Mongo's `.limit(0)`).
+        """
+        if limit is not None and limit <= 0:
+            return
+        query = dict(query or {})
+        yielded = 0
+        while limit is None or yielded < limit:
+            batch_query = dict(query)
+            if after_id is not None:
+                batch_query["_id"] = {"$gt": after_id}
+            size = batch_size if limit is None else min(batch_size, limit - yielded)
+            batch = list(self.collection.find(batch_query, projection).sort("_id", ASCENDING).limit(size))
+            for doc in batch:
+                yield doc
+            yielded += len(batch)
+            if len(batch) < size:
+                return
+            after_id = batch[-1]["_id"]
 
     def get_all_urls(self):
         """Returns a list of all ingested URLs."""
@@ -41,5 +214,7 @@ class MongoStore:
 
     def clear_collection(self):
         """Deletes all documents in the collection."""
+        with self._write_lock:
+            self._pending = []
         self.collection.delete_many({})
         print(f"Collection '{self.collection.name}' cleared.")
@@ -1,9 +1,13 @@
+import json
 from youtube_transcript_api import YouTubeTranscriptApi
 from urllib.parse import urlparse, parse_qs
 
+# Bump when the transcript -> text conversion changes.
+PARSER_VERSION = "transcript/1"
+
 class YouTubeLoader:
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        self.cache = cache
 
     def extract_video_id(self, url):
         query = urlparse(url)
@@ -26,8 +30,12 @@ class YouTubeLoader:
             return None
 
         try:
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            full_text = " ".join([t['text'] for t in transcript_list])
+            transcript_list, digest = self._fetch_transcript(video_id)
+            full_text = self.cache.get_parsed(digest, PARSER_VERSION) if digest else None
+            if full_text is None:
+                full_text = " ".join([t['text'] for t in transcript_list])
+                if digest:
+                    self.cache.put_parsed(digest, PARSER_VERSION, full_text)
             return {
                 "video_id": video_id,
                 "transcript": transcript_list,
@@ -36,3 +44,16 @@ class YouTubeLoader:
         except Exception as e:
             print(f"Error fetching transcript for {url}: {e}")
             return None
+
+    def _fetch_transcript(self, video_id):
+        """Returns (transcript, content hash); the hash is None without a cache."""
+        key = f"youtube:{video_id}"
+        cached = self.cache.get_source(key) if self.cache else None
+        if cached:
+            return json.loads(self.cache.read_bytes(cached["hash"])), cached["hash"]
+
+        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+        if not self.cache:
+            return transcript_list, None
+        digest = self.cache.put_bytes(key, json.dumps(transcript_list).encode('utf-8'))
+        return transcript_list, digest
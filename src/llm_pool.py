@@ -0,0 +1,292 @@
+import asyncio
+from contextlib import aclosing, closing
+import random
+import threading
+import time
+import requests
+from langchain_core.runnables import Runnable
+from src.cache import NO_CACHE
+from src.ratelimit import is_throttle_error
+
+_probe_results = {}
+_probe_lock = threading.Lock()
+
+
+def is_failover_error(exc):
+    """Errors worth retrying on another endpoint: unreachable, overloaded or timed out."""
+    return is_throttle_error(exc) or "Connection" in type(exc).__name__
+
+
+def cached_probe(base_url, ttl):
+    """Last health check result for `base_url` if younger than `ttl`, else None."""
+    with _probe_lock:
+        cached = _probe_results.get(base_url)
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    return None
+
+
+def probe_endpoint(base_url, api_key=None, ttl=60.0, timeout=2.0):
+    """
+    Cheap liveness check: lists the endpoint's models instead of generating.
+    Results are shared by every pool in the process for `ttl` seconds.
+    """
+    healthy = cached_probe(base_url, ttl)
+    if healthy is not None:
+        return healthy
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    try:
+        healthy = requests.get(f"{base_url.rstrip('/')}/models", headers=headers, timeout=timeout).ok
+    except requests.RequestException:
+        healthy = False
+    with _probe_lock:
+        _probe_results[base_url] = (healthy, time.monotonic())
+    return healthy
+
+
+def forget_probe(base_url):
+    with _probe_lock:
+        _probe_results.pop(base_url, None)
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible server. The client is built by `factory` on first
+    use; `base_url` (the API root, e.g. http://host:11434/v1) enables the
+    health probe.
+    """
+    def __init__(self, name, factory, weight=1.0, base_url=None, api_key=None, model_name=None, temperature=None):
+        self.name = name
+        self.factory = factory
+        self.weight = weight
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model_name = model_name
+        self.temperature = temperature
+        self._llm = None
+        self._llm_lock = threading.Lock()
+        self.outstanding = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = self.factory()
+        return self._llm
+
+    def is_available(self, now):
+        # Past the cooldown the circuit is half-open: the next call is a trial.
+        return now >= self.open_until
+
+    def stats(self):
+        return {
+            "outstanding": self.outstanding,
+            "successes": self.successes,
+            "failures": self.failures,
+            "circuit": "open" if time.monotonic() < self.open_until else "closed",
+        }
+
+
+class LLMPool(Runnable):
+    """
+    Spreads calls over several OpenAI-compatible endpoints. Each call goes
+    to the available primary endpoint with the fewest outstanding requests
+    per unit of weight; fallbacks (e.g. a remote provider) are used only
+    while no primary is available, chosen in proportion to their weight.
+    An endpoint that fails `failure_threshold` times in a row, or does not
+    answer its health probe, is skipped for `cooldown` seconds. Connection
+    errors, timeouts, 429s and 5xx responses are retried on the next
+    endpoint; anything else is raised. Nothing touches the network until
+    the first call.
+    """
+    def __init__(self, endpoints, fallbacks=(), failure_threshold=3, cooldown=30.0, probe_ttl=60.0):
+        self.endpoints = list(endpoints)
+        self.fallbacks = list(fallbacks)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_ttl = probe_ttl
+        self._lock = threading.Lock()
+
+        primary = (self.endpoints or self.fallbacks)[0]
+        self.model_name = primary.model_name
+        self.temperature = primary.temperature
+
+    def _acquire(self, tried):
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e not in tried and e.is_available(now)]
+            if candidates:
+                endpoint = min(candidates, key=lambda e: (e.outstanding + 1) / e.weight)
+            else:
+                fallbacks = [e for e in self.fallbacks if e not in tried and e.is_available(now)]
+                if not fallbacks:
+                    return None
+                endpoint = random.choices(fallbacks, weights=[e.weight for e in fallbacks])[0]
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint, exc=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if exc is None:
+                endpoint.successes += 1
+                endpoint.consecutive_failures = 0
+                endpoint.open_until = 0.0
+            elif is_failover_error(exc):
+                if endpoint.base_url:
+                    # A healthy probe result no longer says anything about this host.
+                    forget_probe(endpoint.base_url)
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    if time.monotonic() >= endpoint.open_until:
+                        print(f"LLM endpoint {endpoint.name} unhealthy; skipping it for {self.cooldown:.0f}s")
+                    endpoint.open_until = time.monotonic() + self.cooldown
+
+    def _mark(self, endpoint, message):
+        """
+        Flags answers from a model other than the pool's own (e.g. the remote
+        fallback), so they are not cached under the pool's model name.
+        """
+        if endpoint.model_name != self.model_name and hasattr(message, 'response_metadata'):
+            message.response_metadata[NO_CACHE] = True
+        return message
+
+    def _outcome(self, exc, started):
+        """A caller that closes a stream after tokens arrived got its answer: a success."""
+        if started and isinstance(exc, GeneratorExit):
+            return None
+        return exc
+
+    def _unhealthy(self, endpoint, healthy):
+        if healthy:
+            return False
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.failures += 1
+            endpoint.open_until = time.monotonic() + self.cooldown
+        print(f"LLM endpoint {endpoint.name} failed its health check; skipping it for {self.cooldown:.0f}s")
+        return True
+
+    def _skip_unhealthy(self, endpoint):
+        if endpoint.base_url is None:
+            return False
+        return self._unhealthy(endpoint, probe_endpoint(endpoint.base_url, endpoint.api_key, self.probe_ttl))
+
+    async def _askip_unhealthy(self, endpoint):
+        if endpoint.base_url is None:
+            return False
+        healthy = cached_probe(endpoint.base_url, self.probe_ttl)
+        if healthy is None:
+            try:
+                healthy = await asyncio.to_thread(probe_endpoint, endpoint.base_url, endpoint.api_key, self.probe_ttl)
+            except BaseException:
+                with self._lock:
+                    endpoint.outstanding -= 1
+                raise
+        return self._unhealthy(endpoint, healthy)
+
+    def _attempts(self):
+        tried = []
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                return
+            tried.append(endpoint)
+            yield endpoint
+
+    def _no_endpoint(self, last_error):
+        if last_error:
+            return last_error
+        return RuntimeError("No LLM endpoint available")
+
+    def invoke(self, input, config=None, **kwargs):
+        last_error = None
+        for endpoint in self._attempts():
+            if self._skip_unhealthy(endpoint):
+                continue
+            try:
+                result = endpoint.llm.invoke(input, config, **kwargs)
+            except BaseException as e:
+                self._release(endpoint, e)
+                if not isinstance(e, Exception) or not is_failover_error(e):
+                    raise
+                print(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}); trying next")
+                last_error = e
+                continue
+            self._release(endpoint)
+            return self._mark(endpoint, result)
+        raise self._no_endpoint(last_error)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        last_error = None
+        for endpoint in self._attempts():
+            if await self._askip_unhealthy(endpoint):
+                continue
+            try:
+                result = await endpoint.llm.ainvoke(input, config, **kwargs)
+            except BaseException as e:
+                self._release(endpoint, e)
+                if not isinstance(e, Exception) or not is_failover_error(e):
+                    raise
+                print(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}); trying next")
+                last_error = e
+                continue
+            self._release(endpoint)
+            return self._mark(endpoint, result)
+        raise self._no_endpoint(last_error)
+
+    def stream(self, input, config=None, **kwargs):
+        last_error = None
+        for endpoint in self._attempts():
+            if self._skip_unhealthy(endpoint):
+                continue
+            started = False
+            try:
+                # Closed as soon as the caller stops reading, which ends generation upstream.
+                with closing(endpoint.llm.stream(input, config, **kwargs)) as stream:
+                    for chunk in stream:
+                        started = True
+                        yield self._mark(endpoint, chunk)
+            except BaseException as e:
+                self._release(endpoint, self._outcome(e, started))
+                # Once tokens reached the caller, switching endpoints would garble the answer.
+                if started or not isinstance(e, Exception) or not is_failover_error(e):
+                    raise
+                print(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}); trying next")
+                last_error = e
+                continue
+            self._release(endpoint)
+            return
+        raise self._no_endpoint(last_error)
+
+    async def astream(self, input, config=None, **kwargs):
+        last_error = None
+        for endpoint in self._attempts():
+            if await self._askip_unhealthy(endpoint):
+                continue
+            started = False
+            try:
+                async with aclosing(endpoint.llm.astream(input, config, **kwargs)) as stream:
+                    async for chunk in stream:
+                        started = True
+                        yield self._mark(endpoint, chunk)
+            except BaseException as e:
+                self._release(endpoint, self._outcome(e, started))
+                if started or not isinstance(e, Exception) or not is_failover_error(e):
+                    raise
+                print(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}); trying next")
+                last_error = e
+                continue
+            self._release(endpoint)
+            return
+        raise self._no_endpoint(last_error)
+
+    def stats(self):
+        with self._lock:
+            return {e.name: e.stats() for e in self.endpoints + self.fallbacks}
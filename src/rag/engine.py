@@ -1,13 +1,31 @@
-import networkx as nx
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from src.utils import get_llm
+from src.rag.snapshot import GraphSnapshot, SnapshotWatcher
+from src.graph.persistence import DEFAULT_GRAPH_PATH
+import asyncio
 import json
+import time
+from collections import deque
 
 class QueryEngine:
-    def __init__(self, graph_path="data/knowledge_graph.gml"):
+    """
+    Answers questions from the knowledge graph. One instance can serve many
+    threads and sessions: the graph and its indexes live in an immutable
+    GraphSnapshot, and each query reads the snapshot current when it started.
+
+    With `reload_interval` set, a background thread watches `graph_path`
+    and swaps in a freshly indexed snapshot whenever a build rewrites it.
+    """
+    def __init__(self, graph_path=DEFAULT_GRAPH_PATH, llm_concept_fallback=True, reload_interval=5.0):
         self.llm = get_llm()
-        self.graph = nx.read_gml(graph_path)
+        self.graph_path = graph_path
+        self.snapshot = GraphSnapshot.load(graph_path)
+        self.llm_concept_fallback = llm_concept_fallback
+        self.reloads = deque(maxlen=50)
+        self.watcher = None
+        if reload_interval:
+            self.watcher = SnapshotWatcher(graph_path, self.snapshot, self._swap_snapshot, reload_interval)
         
         # Prompt to map query to concepts
         self.concept_extraction_prompt = ChatPromptTemplate.from_template("""
@@ -43,25 +61,94 @@ class QueryEngine:
         
         self.answer_chain = self.answer_prompt | self.llm | StrOutputParser()
 
-    def extract_concepts(self, query):
-        try:
-            result = self.concept_chain.invoke({"query": query})
-            print(f"Raw concept extraction result: {result}")
+    @property
+    def graph(self):
+        return self.snapshot.graph
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    @property
+    def matcher(self):
+        return self.snapshot.matcher
+
+    def _swap_snapshot(self, snapshot, metrics):
+        # A single reference assignment: queries already running keep the old snapshot.
+        self.snapshot = snapshot
+        metrics["reloaded_at"] = time.time()
+        self.reloads.append(metrics)
+        print(f"Reloaded knowledge graph: {metrics}")
+
+    def close(self):
+        if self.watcher:
+            self.watcher.stop()
+
+    def extract_concepts(self, query, snapshot=None):
+        matcher = (snapshot or self.snapshot).matcher
+        matches = matcher.match(query)
+        if matcher.is_confident(matches):
+            print(f"Matched concepts locally: {matches}")
+            return self._local_concepts(matches, matcher)
+
+        if not self.llm_concept_fallback:
+            return []
+        print("Low local match confidence; asking the LLM for concepts.")
+        return self._merge_concepts(self.extract_concepts_llm(query), matches, matcher)
+
+    async def aextract_concepts(self, query, snapshot=None):
+        matcher = (snapshot or self.snapshot).matcher
+        # Matching is CPU-bound; keep it off the loop so other queries progress.
+        matches = await asyncio.to_thread(matcher.match, query)
+        if matcher.is_confident(matches):
+            print(f"Matched concepts locally: {matches}")
+            return self._local_concepts(matches, matcher)
+
+        if not self.llm_concept_fallback:
+            return []
+        print("Low local match confidence; asking the LLM for concepts.")
+        return self._merge_concepts(await self.aextract_concepts_llm(query), matches, matcher)
+
+    def _local_concepts(self, matches, matcher):
+        return [node for node, score in matches if score >= matcher.min_score]
+
+    def _merge_concepts(self, llm_concepts, matches, matcher):
+        """LLM concepts first, then weaker local candidates it did not name."""
+        merged = list(llm_concepts)
+        for node, score in matches:
+            if score >= matcher.min_score / 2 and node not in merged:
+                merged.append(node)
+        return merged
+
+    def _parse_concepts(self, result):
+        print(f"Raw concept extraction result: {result}")
+        
+        if isinstance(result, dict):
+            concepts = result.get("concept_ids") or result.get("concepts") or []
+        elif isinstance(result, list):
+            concepts = result
+        else:
+            concepts = []
             
-            if isinstance(result, dict):
-                concepts = result.get("concept_ids") or result.get("concepts") or []
-            elif isinstance(result, list):
-                concepts = result
-            else:
-                concepts = []
-                
-            print(f"Identified concepts: {concepts}")
-            return concepts
+        print(f"Identified concepts: {concepts}")
+        return concepts
+
+    def extract_concepts_llm(self, query):
+        try:
+            return self._parse_concepts(self.concept_chain.invoke({"query": query}))
+        except Exception as e:
+            print(f"Error extracting concepts: {e}")
+            return []
+
+    async def aextract_concepts_llm(self, query):
+        try:
+            return self._parse_concepts(await self.concept_chain.ainvoke({"query": query}))
         except Exception as e:
             print(f"Error extracting concepts: {e}")
             return []
 
-    def get_subgraph(self, concepts, radius=1):
+    def get_subgraph(self, concepts, radius=1, snapshot=None):
+        snapshot = snapshot or self.snapshot
         nodes_to_include = set()
         for concept_item in concepts:
             if isinstance(concept_item, dict):
@@ -72,24 +159,14 @@ class QueryEngine:
             if not concept:
                 continue
                 
-            matched_node = None
-            if self.graph.has_node(concept):
-                matched_node = concept
-            else:
-                for node, data in self.graph.nodes(data=True):
-                    if data.get('title', '').lower() == str(concept).lower():
-                        matched_node = node
-                        break
-            
-            if matched_node:
-                undirected_graph = self.graph.to_undirected()
-                subgraph_nodes = nx.single_source_shortest_path_length(undirected_graph, matched_node, cutoff=radius).keys()
-                nodes_to_include.update(subgraph_nodes)
+            matched_node = snapshot.index.lookup(concept)
+            if matched_node is not None:
+                nodes_to_include.update(snapshot.index.neighborhood(matched_node, radius))
         
         if not nodes_to_include:
             return None
             
-        return self.graph.subgraph(nodes_to_include)
+        return snapshot.graph.subgraph(nodes_to_include)
 
     def format_context(self, subgraph):
         if not subgraph:
@@ -115,29 +192,85 @@ class QueryEngine:
             
         return context
 
-    def query(self, user_input):
-        print(f"Processing query: {user_input}")
-        
-        concepts = self.extract_concepts(user_input)
-            
-        subgraph = self.get_subgraph(concepts)
-        context = self.format_context(subgraph)
-        
-        answer = self.answer_chain.invoke({"context": context, "query": user_input})
-        
+    def sanitize_concepts(self, concepts):
         sanitized_concepts = []
         for c in concepts:
             if isinstance(c, dict):
                 sanitized_concepts.append(c.get("title") or c.get("concept_id") or str(c))
             else:
                 sanitized_concepts.append(str(c))
+        return sanitized_concepts
+
+    def _build_context(self, concepts, snapshot):
+        subgraph = self.get_subgraph(concepts, snapshot=snapshot)
+        return {
+            "context": self.format_context(subgraph),
+            "concepts": self.sanitize_concepts(concepts)
+        }
+
+    def retrieve(self, user_input):
+        snapshot = self.snapshot
+        concepts = self.extract_concepts(user_input, snapshot)
+        return self._build_context(concepts, snapshot)
+
+    async def aretrieve(self, user_input):
+        snapshot = self.snapshot
+        concepts = await self.aextract_concepts(user_input, snapshot)
+        return await asyncio.to_thread(self._build_context, concepts, snapshot)
+
+    def query(self, user_input):
+        print(f"Processing query: {user_input}")
+        
+        retrieved = self.retrieve(user_input)
+        answer = self.answer_chain.invoke({"context": retrieved["context"], "query": user_input})
         
         return {
             "answer": answer,
-            "context": context,
-            "concepts": sanitized_concepts
+            **retrieved
         }
 
+    def stream_query(self, user_input):
+        """
+        Yields {"type": "context", "context": ..., "concepts": [...]} once
+        retrieval finishes, then {"type": "token", "content": ...} for each
+        piece of the answer as the model generates it.
+        """
+        print(f"Processing streaming query: {user_input}")
+        
+        retrieved = self.retrieve(user_input)
+        yield {"type": "context", **retrieved}
+        
+        for token in self.answer_chain.stream({"context": retrieved["context"], "query": user_input}):
+            if token:
+                yield {"type": "token", "content": token}
+
+    async def aquery(self, user_input):
+        """
+        Async counterpart of query(). Many calls can share one engine and one
+        loaded graph; cancelling the awaiting task cancels the in-flight LLM
+        request with it.
+        """
+        print(f"Processing query: {user_input}")
+        
+        retrieved = await self.aretrieve(user_input)
+        answer = await self.answer_chain.ainvoke({"context": retrieved["context"], "query": user_input})
+        
+        return {
+            "answer": answer,
+            **retrieved
+        }
+
+    async def astream_query(self, user_input):
+        """Async counterpart of stream_query(), yielding the same events."""
+        print(f"Processing streaming query: {user_input}")
+        
+        retrieved = await self.aretrieve(user_input)
+        yield {"type": "context", **retrieved}
+        
+        async for token in self.answer_chain.astream({"context": retrieved["context"], "query": user_input}):
+            if token:
+                yield {"type": "token", "content": token}
+
 if __name__ == "__main__":
     engine = QueryEngine()
     response = engine.query("What is artificial intelligence?")
@@ -0,0 +1,69 @@
+import re
+from collections import deque
+
+
+def normalize_key(value):
+    """Lowercases and collapses spaces, dashes and underscores so that
+    'Gradient Descent', 'gradient-descent' and 'gradient_descent' all match."""
+    return re.sub(r'[\s_\-]+', '_', str(value).strip().lower()).strip('_')
+
+
+class ConceptIndex:
+    """
+    Lookup tables built once over a loaded graph so that retrieval costs
+    the size of the neighborhood instead of the size of the graph.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.by_title = {}
+        self.by_key = {}
+        self.adjacency = {}
+        self._build()
+
+    def _build(self):
+        for node, data in self.graph.nodes(data=True):
+            title = data.get('title')
+            if title:
+                self.by_title.setdefault(str(title).lower(), node)
+
+            keys = [node, title]
+            aliases = data.get('aliases') or []
+            if isinstance(aliases, str):
+                aliases = [aliases]
+            keys.extend(aliases)
+
+            for key in keys:
+                if key:
+                    self.by_key.setdefault(normalize_key(key), node)
+
+            self.adjacency[node] = set()
+
+        # Undirected adjacency, cached instead of copying the graph per query
+        for u, v in self.graph.edges():
+            self.adjacency[u].add(v)
+            self.adjacency[v].add(u)
+
+    def lookup(self, concept):
+        if concept is None:
+            return None
+        if self.graph.has_node(concept):
+            return concept
+
+        concept = str(concept)
+        node = self.by_title.get(concept.lower())
+        if node is not None:
+            return node
+        return self.by_key.get(normalize_key(concept))
+
+    def neighborhood(self, node, radius=1):
+        seen = {node}
+        frontier = deque([(node, 0)])
+        while frontier:
+            current, depth = frontier.popleft()
+            if depth >= radius:
+                continue
+            for neighbor in self.adjacency.get(current, ()):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    frontier.append((neighbor, depth + 1))
+        return seen
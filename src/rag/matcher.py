@@ -0,0 +1,83 @@
+import re
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+CONCEPT_TYPES = ("concept", "concept_placeholder")
+
+
+def _normalize(text):
+    return " ".join(re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).split())
+
+
+class LexicalConceptMatcher:
+    """
+    Maps a question to concept node ids locally, without an LLM round trip.
+
+    Names (title, id, aliases) are indexed with character n-grams so that
+    plurals and small spelling differences still match; definitions are
+    indexed with word n-grams. A concept whose full name appears in the
+    question is always a confident match.
+    """
+    def __init__(self, graph, min_score=0.3):
+        self.min_score = min_score
+        self.node_ids = []
+        self.names = []
+        self.name_lookup = {}
+        definitions = []
+
+        for node, data in graph.nodes(data=True):
+            if data.get('type') not in CONCEPT_TYPES:
+                continue
+            aliases = data.get('aliases') or []
+            if isinstance(aliases, str):
+                aliases = [aliases]
+            names = {_normalize(n) for n in [node, data.get('title', '')] + list(aliases)}
+            names.discard("")
+            for name in names:
+                if len(name) > 2:
+                    self.name_lookup.setdefault(name, []).append(len(self.node_ids))
+            self.node_ids.append(node)
+            self.names.append(sorted(names, key=len, reverse=True))
+            definitions.append(str(data.get('definition', '')))
+
+        self.max_name_words = max((len(name.split()) for name in self.name_lookup), default=0)
+
+        self.name_vectorizer = None
+        self.definition_vectorizer = None
+        if not self.node_ids:
+            return
+
+        self.name_vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 4), sublinear_tf=True)
+        self.name_matrix = self.name_vectorizer.fit_transform([" ".join(n) for n in self.names])
+
+        if any(d.strip() for d in definitions):
+            self.definition_vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), sublinear_tf=True)
+            self.definition_matrix = self.definition_vectorizer.fit_transform(definitions)
+
+    def match(self, query, top_k=5):
+        """Returns [(node_id, score)] sorted by descending score."""
+        if not self.node_ids:
+            return []
+
+        normalized = _normalize(query)
+        scores = (self.name_matrix @ self.name_vectorizer.transform([normalized]).T).toarray().ravel() * 0.7
+        if self.definition_vectorizer is not None:
+            definition_scores = (self.definition_matrix @ self.definition_vectorizer.transform([query]).T).toarray().ravel()
+            scores += definition_scores * 0.3
+
+        for idx in self._exact_name_hits(normalized):
+            scores[idx] = max(scores[idx], 1.0)
+
+        ranked = scores.argsort()[::-1][:top_k]
+        results = [(self.node_ids[idx], float(scores[idx])) for idx in ranked if scores[idx] > 0]
+        return results
+
+    def _exact_name_hits(self, normalized):
+        words = normalized.split()
+        hits = set()
+        for size in range(1, self.max_name_words + 1):
+            for start in range(len(words) - size + 1):
+                hits.update(self.name_lookup.get(" ".join(words[start:start + size]), ()))
+        return hits
+
+    def is_confident(self, matches):
+        return bool(matches) and matches[0][1] >= self.min_score
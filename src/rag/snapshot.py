@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from src.graph.persistence import load_graph, resolve_graph_path
+from src.rag.index import ConceptIndex
+from src.rag.matcher import LexicalConceptMatcher
+
+
+def file_signature(path):
+    """(path, mtime, size) of the file load_graph would read, or None if missing."""
+    resolved = resolve_graph_path(path)
+    if resolved is None:
+        return None
+    stat = os.stat(resolved)
+    return (resolved, stat.st_mtime_ns, stat.st_size)
+
+
+class GraphSnapshot:
+    """
+    A loaded graph together with the indexes built over it. Snapshots are
+    never modified; a reload builds a new one and swaps the reference.
+    """
+    def __init__(self, graph, signature=None):
+        self.graph = graph
+        self.signature = signature
+        self.index = ConceptIndex(graph)
+        self.matcher = LexicalConceptMatcher(graph)
+
+    @classmethod
+    def load(cls, path):
+        # Stat first: if the file changes mid-load, the next poll sees a newer signature.
+        signature = file_signature(path)
+        return cls(load_graph(path), signature)
+
+
+class SnapshotWatcher:
+    """
+    Polls the graph file every `interval` seconds and, when its mtime or
+    size changes, loads and indexes the new graph on this background thread
+    before handing it to `on_reload(snapshot, metrics)`.
+    """
+    def __init__(self, path, current, on_reload, interval=5.0):
+        self.path = path
+        self.on_reload = on_reload
+        self.interval = interval
+        self._current = current
+        self._failed_signature = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="graph-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Graph reload check failed: {e}")
+
+    def check(self):
+        signature = file_signature(self.path)
+        if signature is None or signature in (self._current.signature, self._failed_signature):
+            return None
+
+        start = time.perf_counter()
+        try:
+            snapshot = GraphSnapshot.load(self.path)
+        except Exception as e:
+            # Keep serving the old graph; retry once the file changes again.
+            self._failed_signature = signature
+            print(f"Failed to reload graph from {signature[0]}: {e}")
+            return None
+
+        previous = self._current
+        metrics = {
+            "path": signature[0],
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "nodes": snapshot.graph.number_of_nodes(),
+            "edges": snapshot.graph.number_of_edges(),
+            "node_delta": snapshot.graph.number_of_nodes() - previous.graph.number_of_nodes(),
+            "edge_delta": snapshot.graph.number_of_edges() - previous.graph.number_of_edges(),
+        }
+        self._current = snapshot
+        self.on_reload(snapshot, metrics)
+        return metrics
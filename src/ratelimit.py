@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+def is_throttle_error(exc):
+    """True for errors that mean the backend is overloaded: timeouts, 429s and 5xx."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return any(marker in name for marker in ("Timeout", "RateLimit", "InternalServer", "ServiceUnavailable"))
+
+
+class TokenBucket:
+    """
+    Tokens-per-minute budget; callers wait until their estimated tokens fit.
+    `capacity` caps the burst (defaults to a full minute's worth).
+    """
+    def __init__(self, tokens_per_minute, capacity=None):
+        self.capacity = capacity or tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self, tokens):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) / self.rate)
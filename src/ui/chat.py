@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import os
+import time
 
 # Add project root to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
@@ -11,23 +12,28 @@ st.set_page_config(page_title="Erica - AI Tutor", page_icon="🎓")
 
 st.title("🎓 Erica - Your AI Tutor")
 
-# Initialize chat history
+@st.cache_resource(show_spinner="Initializing Knowledge Base...")
+def get_engine():
+    # One engine per process: every session shares the graph, indexes and LLM client.
+    return QueryEngine()
+
+# Initialize chat history (the only per-session state)
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # Initialize engine
-if "engine" not in st.session_state:
-    with st.spinner("Initializing Knowledge Base..."):
-        try:
-            st.session_state.engine = QueryEngine()
-            st.success("Ready!")
-        except Exception as e:
-            st.error(f"Failed to initialize engine: {e}")
+try:
+    engine = get_engine()
+except Exception as e:
+    engine = None
+    st.error(f"Failed to initialize engine: {e}")
 
 # Display chat messages
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("ttft") is not None:
+            st.caption(f"First token after {message['ttft']:.1f}s")
 
 # React to user input
 if prompt := st.chat_input("Ask me anything about the AI course..."):
@@ -37,34 +43,41 @@ if prompt := st.chat_input("Ask me anything about the AI course..."):
 
     # Generate response
     with st.chat_message("assistant"):
-        if "engine" in st.session_state:
-            with st.spinner("Thinking..."):
-                try:
-                    result = st.session_state.engine.query(prompt)
-                    
-                    # Handle both string (legacy) and dict responses
-                    if isinstance(result, dict):
-                        response = result["answer"]
-                        context = result["context"]
-                        concepts = result.get("concepts", [])
+        if engine is not None:
+            try:
+                start = time.perf_counter()
+                ttft = None
+                response = ""
+                context = None
+                concepts = []
+
+                placeholder = st.empty()
+                placeholder.markdown("_Thinking..._")
+                for event in engine.stream_query(prompt):
+                    if event["type"] == "context":
+                        context = event["context"]
+                        concepts = event.get("concepts", [])
+                    elif event["type"] == "token":
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                            print(f"Time to first token: {ttft:.2f}s")
+                        response += event["content"]
+                        placeholder.markdown(response + "▌")
+                placeholder.markdown(response)
+                if ttft is not None:
+                    st.caption(f"First token after {ttft:.1f}s")
+                
+                # Show context in expander
+                with st.expander("🔍 View RAG Context"):
+                    if concepts:
+                        st.write(f"**Identified Concepts:** {', '.join(concepts)}")
+                    if context:
+                        st.text(context)
                     else:
-                        response = result
-                        context = None
-                        concepts = []
+                        st.warning("No context retrieved from the Knowledge Graph.")
                         
-                    st.markdown(response)
-                    
-                    # Show context in expander
-                    with st.expander("🔍 View RAG Context"):
-                        if concepts:
-                            st.write(f"**Identified Concepts:** {', '.join(concepts)}")
-                        if context:
-                            st.text(context)
-                        else:
-                            st.warning("No context retrieved from the Knowledge Graph.")
-                            
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                except Exception as e:
-                    st.error(f"Error generating response: {e}")
+                st.session_state.messages.append({"role": "assistant", "content": response, "ttft": ttft})
+            except Exception as e:
+                st.error(f"Error generating response: {e}")
         else:
             st.error("Engine not initialized.")
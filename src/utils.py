@@ -1,32 +1,76 @@
 import os
+from functools import lru_cache
 from langchain_openai import ChatOpenAI
+from src.cache import CachedLLM, get_response_cache
+from src.llm_pool import Endpoint, LLMPool
 
-def get_llm(model_name="qwen2.5:0.5b", provider=None):
-    def get_ollama():
-        print(f"Connecting to local Ollama with model: {model_name}...")
-        ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
-        try:
-            llm = ChatOpenAI(
-                base_url=f"{ollama_base_url}/v1",
+@lru_cache(maxsize=1)
+def _token_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Warning: tiktoken encoding unavailable ({e}); estimating tokens from length.")
+        return None
+
+def count_tokens(text):
+    """Approximate token count (cl100k); close enough for budgeting local models too."""
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def get_llm(model_name="qwen2.5:0.5b", provider=None, use_cache=None):
+    if use_cache is None:
+        use_cache = os.getenv("LLM_CACHE", "1") != "0"
+
+    llm = _select_llm(model_name, provider)
+    if llm and use_cache:
+        return CachedLLM(llm, get_response_cache())
+    return llm
+
+def ollama_endpoints():
+    """
+    Local inference hosts from OLLAMA_BASE_URLS ("http://a:11434,http://b:11434|2",
+    optional |weight), falling back to the single OLLAMA_BASE_URL.
+    """
+    raw = os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+    endpoints = []
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, weight = entry.partition("|")
+        endpoints.append((url.rstrip("/"), float(weight) if weight else 1.0))
+    return endpoints
+
+def _select_llm(model_name, provider):
+    # Clients are built on first use and hosts are probed (GET /models) at
+    # call time, so constructing an engine or builder never waits on a model.
+    def ollama_endpoint(base_url, weight):
+        def connect():
+            print(f"Connecting to local Ollama at {base_url} with model: {model_name}...")
+            return ChatOpenAI(
+                base_url=f"{base_url}/v1",
                 api_key="ollama",
                 model=model_name,
                 temperature=0,
                 max_retries=1,
                 request_timeout=120
             )
-            llm.invoke("test")
-            print("Connected to Ollama successfully.")
-            return llm
-        except Exception as e:
-            print(f"Failed to connect to Ollama: {e}")
-            return None
+        return Endpoint(base_url, connect, weight, base_url=f"{base_url}/v1", model_name=model_name, temperature=0)
 
-    def get_openrouter():
+    def openrouter_endpoint():
         api_key = os.getenv("OPENAI_API_KEY")
         base_url = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
         fallback_model = "qwen/qwen-2.5-7b-instruct"
         
-        if api_key:
+        if not api_key:
+            if provider == 'openrouter':
+                print("No OpenRouter API key found.")
+            return None
+
+        def connect():
             print(f"Connecting to OpenRouter with model: {fallback_model}")
             return ChatOpenAI(
                 base_url=base_url,
@@ -34,17 +78,22 @@ def get_llm(model_name="qwen2.5:0.5b", provider=None):
                 model=fallback_model,
                 temperature=0,
             )
-        print("No OpenRouter API key found.")
-        return None
+        return Endpoint("openrouter", connect, float(os.getenv("OPENROUTER_WEIGHT", 1.0)),
+                        base_url=base_url, api_key=api_key, model_name=fallback_model, temperature=0)
 
-    if provider == 'ollama':
-        return get_ollama()
-    elif provider == 'openrouter':
-        return get_openrouter()
-    else:
-        llm = get_ollama()
-        if llm:
-            return llm
-        
-        print("Falling back to OpenRouter...")
-        return get_openrouter()
+    local = []
+    if provider in (None, 'ollama'):
+        local = [ollama_endpoint(url, weight) for url, weight in ollama_endpoints()]
+
+    remote = []
+    if provider in (None, 'openrouter'):
+        endpoint = openrouter_endpoint()
+        if endpoint:
+            remote.append(endpoint)
+
+    if provider == 'openrouter':
+        local, remote = remote, []
+    if not local and not remote:
+        return None
+    # Local hosts share the load; the remote provider only takes over when none is healthy.
+    return LLMPool(local, fallbacks=remote, probe_ttl=float(os.getenv("LLM_PROBE_TTL", 60)))
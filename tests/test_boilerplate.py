@@ -0,0 +1,33 @@
+from src.ingestion.boilerplate import BoilerplateDetector
+
+NAV = ["Home", "Syllabus", "Lectures", "Assignments"]
+FOOTER = ["Course staff", "Office hours", "Copyright 2024"]
+
+
+def page(i):
+    body = [f"Lecture {i}: topic {i}", "Example", f"Consider input {i}.", "$$", f"x_{i} = {i}", "$$", f"So x_{i} grows."]
+    return "\n".join(NAV + body + FOOTER)
+
+
+def learned_detector(pages=10):
+    detector = BoilerplateDetector()
+    for i in range(pages):
+        detector.add("example.com", page(i))
+    return detector
+
+
+def test_strips_repeated_blocks():
+    text = learned_detector().strip("example.com", page(3))
+    for line in NAV + FOOTER:
+        assert line not in text.splitlines()
+    assert "Lecture 3: topic 3" in text
+
+
+def test_keeps_repeated_content_lines():
+    lines = learned_detector().strip("example.com", page(3)).splitlines()
+    assert lines == ["Lecture 3: topic 3", "Example", "Consider input 3.", "$$", "x_3 = 3", "$$", "So x_3 grows."]
+
+
+def test_small_hosts_are_untouched():
+    detector = learned_detector(pages=2)
+    assert detector.strip("example.com", page(1)) == page(1)
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+
+pytest.importorskip("langchain.text_splitter")
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import Runnable
+from src.graph import builder as builder_module
+
+
+class FakeStore:
+    """Serves documents in _id order, like MongoStore.iter_documents."""
+    def __init__(self, docs):
+        self.docs = docs
+
+    def iter_documents(self, query=None, projection=None, after_id=None, limit=None):
+        docs = [dict(doc) for doc in sorted(self.docs, key=lambda d: d["_id"])
+                if after_id is None or doc["_id"] > after_id]
+        return (doc for doc in docs[:limit])
+
+    def mark_built(self, doc_id, content_hash):
+        pass
+
+    def flush(self):
+        pass
+
+
+class FakeLLM(Runnable):
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, input, config=None, **kwargs):
+        raise NotImplementedError
+
+    async def astream(self, input, config=None, **kwargs):
+        text = input.to_string()
+        self.prompts.append(text)
+        word = text.split("TEXT:")[1].split()[0]
+        yield AIMessageChunk(content='{"concepts": [{"id": "%s"}]}' % word)
+
+
+def make_builder(monkeypatch, tmp_path, docs):
+    monkeypatch.setattr(builder_module, "MongoStore", lambda: FakeStore(docs))
+    monkeypatch.setattr(builder_module, "get_llm", lambda provider=None: FakeLLM())
+    builder = builder_module.GraphBuilder(persistent_dir=str(tmp_path))
+    builder.extraction_prompt = builder_module.ChatPromptTemplate.from_template("TEXT: {text}")
+    return builder
+
+
+def build(builder, **kwargs):
+    asyncio.run(builder.build_graph_async(query={"type": "web_page"}, dedup_threshold=0, resume=True, **kwargs))
+    builder._journal_executor.shutdown()
+    builder._checkpoint_executor.shutdown()
+
+
+def make_docs():
+    return [{"_id": i, "url": f"http://example.com/{i}", "type": "web_page", "metadata": {},
+             "content": f"topic{i} lecture notes", "content_hash": f"h{i}"} for i in range(1, 5)]
+
+
+def test_complete_run_clears_resume_point(monkeypatch, tmp_path):
+    docs = make_docs()
+    build(make_builder(monkeypatch, tmp_path, docs))
+
+    builder = make_builder(monkeypatch, tmp_path, docs)
+    assert builder.resume_points == {}
+
+    # A document before the old resume point changes; a resumed run must still see it.
+    docs[0]["content"] = "revised lecture notes"
+    docs[0]["content_hash"] = "h1b"
+    build(builder)
+    assert any("TEXT: revised" in prompt for prompt in builder.llm.prompts)
+
+
+def test_interrupted_run_keeps_resume_point(monkeypatch, tmp_path):
+    docs = make_docs()
+    build(make_builder(monkeypatch, tmp_path, docs), limit=2)
+
+    builder = make_builder(monkeypatch, tmp_path, docs)
+    assert list(builder.resume_points.values()) == [2]
+    build(builder)
+    assert [prompt.split("TEXT:")[1].split()[0] for prompt in builder.llm.prompts] == ["topic3", "topic4"]